@@ -0,0 +1,43 @@
+"""Muledump Render: parses ROTMG assets into Muledump's constants.js, renders.png and sheets.js.
+
+The stages are plain functions, loaded on first use so importing the package stays cheap:
+
+    source = Source("https://assets.muledump.com")
+    xmlfiles = gather_sources(source)
+    assets = parse_assets(xmlfiles)
+    atlas = render_atlas(source, assets)
+    write_constants(dest, assets)
+    write_renders(dest, atlas.pages)
+    write_sheets(dest, source, assets, atlas.pages)
+
+build() runs all of them the way the command line does.
+"""
+import importlib
+
+VERSION = "1.0"
+
+_EXPORTS = {
+    "Source": "source",
+    "gather_sources": "source",
+    "HttpCache": "httpcache",
+    "ParseCache": "parsecache",
+    "Assets": "assets",
+    "parse_assets": "assets",
+    "Atlas": "atlas",
+    "render_atlas": "atlas",
+    "write_constants": "output",
+    "write_renders": "output",
+    "write_sheets": "output",
+    "PreviousBuild": "manifest",
+    "load_previous": "manifest",
+    "save_manifest": "manifest",
+    "build": "pipeline",
+}
+
+__all__ = ["VERSION", *_EXPORTS]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
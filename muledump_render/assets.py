@@ -0,0 +1,451 @@
+import hashlib
+import io
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import nullcontext
+from xml.etree import ElementTree
+
+
+def argb_split(x):
+    return (x & 0xFFFFFFFF).to_bytes(4, 'big')
+
+
+class XmlObject:
+    # compact record of one xml element: attributes, its own text and children grouped by tag
+    __slots__ = ("attrib", "cdata", "children")
+
+    def __init__(self, elem):
+        self.attrib = dict(elem.attrib)
+        self.cdata = (elem.text or "") + "".join(child.tail or "" for child in elem)
+        self.children = {}
+        for child in elem:
+            self.children.setdefault(child.tag, []).append(XmlObject(child))
+
+    def __contains__(self, tag):
+        return tag in self.children
+
+    def __getitem__(self, key):
+        return self.attrib.get(key)
+
+    def first(self, tag):
+        return self.children[tag][0]
+
+    def all(self, tag):
+        return self.children.get(tag, [])
+
+    def text(self, tag):
+        return self.children[tag][0].cdata
+
+
+class Item:
+    # an items entry, iterated in constants.js order; render_atlas() fills in x, y and page
+    __slots__ = ("id", "slot", "tier", "x", "y", "xp", "fp", "bagtype", "soulbound", "utst", "page")
+
+    def __init__(self, id, slot, tier, x, y, xp, fp, bagtype, soulbound, utst, page):
+        self.id = id
+        self.slot = slot
+        self.tier = tier
+        self.x = x
+        self.y = y
+        self.xp = xp
+        self.fp = fp
+        self.bagtype = bagtype
+        self.soulbound = soulbound
+        self.utst = utst
+        self.page = page
+
+    def __iter__(self):
+        return iter((self.id, self.slot, self.tier, self.x, self.y, self.xp, self.fp, self.bagtype, self.soulbound, self.utst, self.page))
+
+
+class TableRecord:
+    __slots__ = ()
+
+    def entry(self):
+        # the constants.js value of a record whose first field is its key
+        return list(self[1:])
+
+
+# the records read_objects() emits; tuples, so they are small, immutable and cheap to pickle
+# tile is (sheet, index, mask sheet, mask index, tex, quantity)
+ItemRecord = namedtuple("ItemRecord", "type id slot tier xp fp bagtype soulbound utst tile")
+# one half of a textures entry: offset 0 for the clothing dye (Tex1), 2 for the accessory dye (Tex2)
+TextureRecord = namedtuple("TextureRecord", "tex offset id type")
+# a sheet sheets.js embeds; table is "skinfile" or "petskinfile"
+SheetRecord = namedtuple("SheetRecord", "table sheet")
+PetAbilityRecord = namedtuple("PetAbilityRecord", "type id")
+
+
+class ClassRecord(TableRecord, namedtuple("ClassRecord", "type id base averages maxes slots")):
+    __slots__ = ()
+
+
+class SkinRecord(TableRecord, namedtuple("SkinRecord", "type id index size16 sheet playerclass")):
+    __slots__ = ()
+
+
+class PetRecord(TableRecord, namedtuple("PetRecord", "type id family rarity defaultskin size")):
+    __slots__ = ()
+
+
+class PetSkinRecord(TableRecord, namedtuple("PetSkinRecord", "type id displayid tier family rarity index size16 sheet")):
+    __slots__ = ()
+
+
+def parse_objects(xmldata):
+    # stream the Objects/Object elements of an xml file into records, freeing each element once read
+    objects = []
+    depth = 0
+    for event, elem in ElementTree.iterparse(io.BytesIO(xmldata), events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 1:
+                if elem.tag != "Objects":
+                    return objects
+                root = elem
+            continue
+        if depth == 2:
+            if elem.tag == "Object":
+                objects.append(XmlObject(elem))
+            root.clear()
+        depth -= 1
+    return objects
+
+
+def read_objects(href, objects):
+    # turn the objects of one xml file into an ordered list of the Record classes above, replayed by Assets.apply
+    records = []
+    for obj in objects:
+        if "Class" not in obj:
+            continue
+        clazz = obj.first("Class")
+        if clazz.cdata == "Player":
+            baseStats = [
+                int(obj.text("MaxHitPoints")),
+                int(obj.text("MaxMagicPoints")),
+                int(obj.text("Attack")),
+                int(obj.text("Defense")),
+                int(obj.text("Speed")),
+                int(obj.text("Dexterity")),
+                int(obj.text("HpRegen")),
+                int(obj.text("MpRegen")),
+            ]
+            averages = {}
+            for f in obj.all("LevelIncrease"):
+                averages[f.cdata] = (int(f["min"]) + int(f["max"])) / 2 * 19
+            avgs = [
+                averages["MaxHitPoints"],
+                averages["MaxMagicPoints"],
+                averages["Attack"],
+                averages["Defense"],
+                averages["Speed"],
+                averages["Dexterity"],
+                averages["HpRegen"],
+                averages["MpRegen"],
+            ]
+            avgs = [x+y for x,y in zip(baseStats, avgs)]
+            if obj["type"].startswith("0x"):
+                key = int(obj["type"][2:], 16)
+            else:
+                1/0
+            records.append(ClassRecord(
+                key,
+                obj["id"],
+                baseStats,
+                avgs,
+                [
+                    int(obj.first("MaxHitPoints")["max"]),
+                    int(obj.first("MaxMagicPoints")["max"]),
+                    int(obj.first("Attack")["max"]),
+                    int(obj.first("Defense")["max"]),
+                    int(obj.first("Speed")["max"]),
+                    int(obj.first("Dexterity")["max"]),
+                    int(obj.first("HpRegen")["max"]),
+                    int(obj.first("MpRegen")["max"]),
+                ],
+                [int(x) for x in obj.text("SlotTypes").split(",")[:4]]
+            ))
+            if obj.first("AnimatedTexture").text("Index").startswith('0x'):
+                index = int(obj.first("AnimatedTexture").text("Index")[2:], 16)
+            else:
+                index = int(obj.first("AnimatedTexture").text("Index"))
+            records.append(SkinRecord(
+                key,
+                obj["id"],
+                index,
+                False,
+                obj.first("AnimatedTexture").text("File"),
+                key,
+            ))
+        if clazz.cdata == "Skin" or "Skin" in obj:
+            if not obj.text("PlayerClassType").startswith('0x'):
+                1/0
+            if not obj["type"].startswith('0x'):
+                1/0
+            if obj.first("AnimatedTexture").text("Index").startswith('0x'):
+                index = int(obj.first("AnimatedTexture").text("Index")[2:], 16)
+            else:
+                index = int(obj.first("AnimatedTexture").text("Index"))
+            records.append(SkinRecord(
+                int(obj["type"][2:], 16),
+                obj["id"],
+                index,
+                "16" in obj.first("AnimatedTexture").text("File"),
+                obj.first("AnimatedTexture").text("File"),
+                int(obj.text("PlayerClassType")[2:], 16)
+            ))
+            records.append(SheetRecord("skinfile", obj.first("AnimatedTexture").text("File")))
+        elif clazz.cdata == "PetAbility" or "PetAbility" in obj:
+            if obj["type"].startswith("0x"):
+                records.append(PetAbilityRecord(int(obj["type"][2:], 16), obj["id"]))
+            else:
+                1/0
+        if clazz.cdata == "Dye":
+            if "Tex1" in obj:
+                key = obj.text("Tex1")
+                offs = 0
+            elif "Tex2" in obj:
+                key = obj.text("Tex2")
+                offs = 2
+            else:
+                1/0
+            if key.startswith("0x"):
+                key = int(key[2:], 16)
+            else:
+                1/0 #key = int(key)
+            if obj["type"].startswith("0x"):
+                records.append(TextureRecord(key, offs, obj["id"], int(obj["type"][2:], 16)))
+            else:
+                1/0
+        if clazz.cdata == "Equipment" or clazz.cdata == "Dye":
+            if "BagType" not in obj:
+                # Procs are Equipment too for some reason!??
+                # but also there are items without bags? e.g. Beer Slurp
+                BagType = 0
+            else:
+                BagType = int(obj.text("BagType"))
+            if "DisplayId" in obj and clazz.cdata != "Dye":
+                id = obj.text("DisplayId")
+            else:
+                id = obj["id"]
+            #print(id)
+            type = obj["type"]
+            if type.startswith("0x"):
+                type = int(type[2:], 16)
+            else:
+                type = int(type)
+            if "Tier" in obj:
+                tier = int(obj.text("Tier"))
+            else:
+                tier = -1
+            if "XPBonus" in obj:
+                xp = int(obj.text("XPBonus"))
+            else:
+                xp = 0
+            if "feedPower" in obj:
+                fp = int(obj.text("feedPower"))
+            else:
+                fp = 0
+            slot = int(obj.text("SlotType"))
+            soulbound = "Soulbound" in obj
+            utst = 0
+            if "setName" in repr(obj.attrib) or "setName" in obj.cdata:
+                utst = 2
+            elif (slot >= 1 and slot <= 9) or (slot >= 11 and slot <= 25):
+                if soulbound and tier == -1:
+                    utst = 1
+
+            if "Texture" in obj:
+                imagename = obj.first("Texture").text("File")
+                imageindex = obj.first("Texture").text("Index")
+            else:
+                imagename = obj.first("AnimatedTexture").text("File")
+                imageindex = obj.first("AnimatedTexture").text("Index")
+            if imageindex.startswith("0x"):
+                imageindex = int(imageindex[2:], 16)
+            else:
+                imageindex = int(imageindex)
+
+            maskname = maskindex = tex = None
+            if "Mask" in obj:
+                maskname = obj.first("Mask").text("File")
+                maskindex = obj.first("Mask").text("Index")
+                if maskindex.startswith("0x"):
+                    maskindex = int(maskindex[2:], 16)
+                else:
+                    print(href,id)
+                    1/0
+                if "Tex1" in obj and "Tex2" in obj:
+                    print(href,id)
+                    1/0
+                elif "Tex1" in obj:
+                    tex = obj.text("Tex1")
+                elif "Tex2" in obj:
+                    tex = obj.text("Tex2")
+                else:
+                    print(href,id)
+                    1/0
+                if tex.startswith("0x"):
+                    tex = int(tex[2:], 16)
+                else:
+                    print(href,id)
+                    1/0
+                a,r,g,b = argb_split(tex)
+                if a != 1 and (r > 0 or g > 0):
+                    print("invalid texture, would crash:", href,id)
+                    print("continuing with error.png instead.")
+
+            num = obj.text("Quantity") if "Quantity" in obj else None
+            records.append(ItemRecord(type, id, slot, tier, xp, fp, BagType, soulbound, utst, (imagename, imageindex, maskname, maskindex, tex, num)))
+
+        if clazz.cdata == "Pet":
+            petid = obj["type"]
+            if petid.startswith("0x"):
+                petid = petid[2:]
+            petid = int(petid, 16)
+            pet = {
+                "id": obj["id"]
+            }
+            for key in ["Family", "Rarity", "DefaultSkin", "Size"]:
+                pet[key] = None if key not in obj else obj.text(key).replace('\n', '').strip()
+                if key == "Size":
+                    pet[key] = int(pet[key])
+                if pet[key] == "":
+                    pet[key] = None
+            records.append(PetRecord(petid, *pet.values()))
+
+        if clazz.cdata == "PetSkin":
+            petskinid = obj["type"]
+            if petskinid.startswith("0x"):
+                petskinid = petskinid[2:]
+            petskinid = int(petskinid, 16)
+            petSkin = {
+                "id": obj["id"]
+            }
+            for key in ["DisplayId", "ItemTier", "Family", "Rarity"]:
+                petSkin[key] = None if key not in obj else obj.text(key).replace('\n', '').strip()
+                if key == "ItemTier" and petSkin[key] is not None:
+                    petSkin[key] = int(petSkin[key])
+                if petSkin[key] == "":
+                    petSkin[key] = None
+
+            if obj.first("AnimatedTexture").text("Index").startswith('0x'):
+                index = int(obj.first("AnimatedTexture").text("Index")[2:], 16)
+            else:
+                index = int(obj.first("AnimatedTexture").text("Index"))
+            petSkin["index"] = index
+            petSkin["16"] = "16" in obj.first("AnimatedTexture").text("File")
+            petSkin["AnimatedTexture"] = obj.first("AnimatedTexture").text("File")
+            records.append(PetSkinRecord(petskinid, *petSkin.values()))
+            records.append(SheetRecord("petskinfile", obj.first("AnimatedTexture").text("File")))
+    return records
+
+
+def textile_size(tex):
+    # size of the textile sheet a Tex1/Tex2 value points at, or None for colours and invalid textures
+    a,r,g,b = argb_split(tex)
+    if a == 1 or r > 0 or g > 0:
+        return None
+    return a
+
+
+class Assets:
+    """Everything parsed from the XML: the constants.js tables, the sheets sheets.js embeds and the atlas cells."""
+
+    def __init__(self):
+        self.items = {
+             -1: Item("Empty Slot", 0, -1, 5, 5, 0, 0, 0, False, 0, 0),
+              0x0: Item("Unknown Item", 0, -1, 50, 5, 0, 0, 0, False, 0, 0),
+        }
+        self.classes = {}
+        self.skins = {}
+        self.petAbilities = {}
+        self.textures = {}
+        self.pets = {}
+        self.petSkins = {}
+        self.skinfiles = set(["players"])
+        self.textilefiles = set()
+        self.petskinfiles = set()
+        # (items entry, tile) for every item in atlas order; render_atlas fills in the x, y and page
+        self.cells = []
+        # href -> sha256 of the xml file, and how many of them came from the parse cache
+        self.xml = {}
+        self.cached = 0
+
+    def apply(self, record):
+        # records are shared with the parse cache, so the tables only ever take values from them
+        if isinstance(record, ItemRecord):
+            self.items[record.type] = Item(record.id, record.slot, record.tier, None, None, record.xp, record.fp, record.bagtype, record.soulbound, record.utst, None)
+            self.cells.append((self.items[record.type], record.tile))
+            tex = record.tile[4]
+            if tex is not None and textile_size(tex) is not None:
+                self.textilefiles.add(textile_size(tex))
+        elif isinstance(record, TextureRecord):
+            data = self.textures.get(record.tex, [None]*4)
+            data[record.offset+0] = record.id
+            data[record.offset+1] = record.type
+            self.textures[record.tex] = data
+        elif isinstance(record, SheetRecord):
+            getattr(self, f"{record.table}s").add(record.sheet)
+        elif isinstance(record, ClassRecord):
+            self.classes[record.type] = record
+        elif isinstance(record, SkinRecord):
+            self.skins[record.type] = record
+        elif isinstance(record, PetAbilityRecord):
+            self.petAbilities[record.type] = record.id
+        elif isinstance(record, PetRecord):
+            self.pets[record.type] = record
+        elif isinstance(record, PetSkinRecord):
+            self.petSkins[record.type] = record
+        else:
+            raise ValueError(f"cannot apply a {type(record).__name__} record: {record!r}")
+
+
+def parse_records(href, xmldata):
+    # read_objects() of one xml file; a file that is not well-formed has no records
+    try:
+        return read_objects(href, parse_objects(xmldata))
+    except ElementTree.ParseError:
+        return []
+
+
+def parse_assets(xmlfiles, cache=None, metrics=None, pool=None):
+    """Parse (href, future) pairs from gather_sources() into Assets, in href order.
+
+    Files whose hash is in cache (a ParseCache) replay its records instead of being parsed, and the records
+    of the others are added to it. With a pool (a JobPool) the other files are parsed on its worker
+    processes as they arrive, and every file's records are applied in href order once all are queued.
+    """
+    assets = Assets()
+    queued = []
+    for href, xmlfetch in xmlfiles:
+        xmldata = xmlfetch.result()
+        with (nullcontext({}) if metrics is None else metrics.xml_file(href, len(xmldata))) as entry:
+            xmlhash = hashlib.sha256(xmldata).hexdigest()
+            records = cache.get(xmlhash) if cache is not None else None
+            if records is not None:
+                assets.cached += 1
+                entry["reused"] = True
+            elif pool is not None:
+                records = pool.submit(parse_records, href, xmldata)
+            else:
+                records = parse_records(href, xmldata)
+                if cache is not None:
+                    cache.put(xmlhash, records)
+            assets.xml[href] = xmlhash
+            if pool is not None:
+                queued.append((xmlhash, records, entry))
+                continue
+            for record in records:
+                assets.apply(record)
+            entry["records"] = len(records)
+
+    for xmlhash, records, entry in queued:
+        if isinstance(records, Future):
+            records = records.result()
+            if cache is not None:
+                cache.put(xmlhash, records)
+        for record in records:
+            assets.apply(record)
+        entry["records"] = len(records)
+    return assets
@@ -0,0 +1,430 @@
+import hashlib
+import os
+import struct
+from collections import Counter
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image, ImageDraw
+
+from .assets import argb_split, textile_size
+from .metrics import timed
+from .png import PngWriter
+from .sprites import Layout, SpriteIndex
+
+ERROR_PNG = os.path.join(os.path.dirname(__file__), "error.png")
+TILE_BATCH = 256
+BLACK = np.array([0, 0, 0, 255], np.uint32)
+CELL = 45
+PAGE_COLUMNS = 100
+PAGE_ROWS = 100
+RESERVED_CELLS = 2 # Empty and Unknown slots at the start of the first page
+
+
+class Atlas:
+    """The renders pages as PNG files, every item cell as [page, x, y, tile], tile cache counts, the
+    digest of the manifest.xml sheet layouts were read from, the [compress_level, optimize] the pages were
+    encoded with and how many pages were copied from the previous build as they were."""
+
+    def __init__(self, pages, tiles, hits, misses, reused, shared, layouts=None, png=None, copied=0):
+        self.pages = pages
+        self.tiles = tiles
+        self.hits = hits
+        self.misses = misses
+        self.reused = reused
+        self.shared = shared
+        self.layouts = layouts
+        self.png = png
+        self.copied = copied
+
+
+def tile_sheets(tile):
+    imagename, imageindex, maskname, maskindex, tex, num = tile
+    sheets = [imagename]
+    if maskname is not None:
+        sheets.append(maskname)
+        if textile_size(tex) is not None:
+            sheets.append(f"textile{textile_size(tex)}x{textile_size(tex)}")
+    return sheets
+
+
+def tile_key(tile, index):
+    # everything that decides how a tile looks: sheet, index, sheet layout, mask, tex and quantity
+    imagename, imageindex, maskname, maskindex, tex, num = tile
+    return (imagename, imageindex, index.layout(imagename), maskname, maskindex, tex, num)
+
+
+def previous_cell(previous, source, tile, index):
+    # cell of the same tile in the previous renders.png, as long as none of the sheets it is drawn from
+    # and no sheet layout changed
+    if previous is None or tuple(tile) not in previous.tiles:
+        return None
+    if previous.manifest.get("layouts") != index.digest:
+        return None
+    if any(source.sheet_hash(sheet) != previous.manifest["sheets"].get(sheet) for sheet in tile_sheets(tile)):
+        return None
+    return previous.tiles[tuple(tile)]
+
+
+def cell_position(n):
+    # page, x, y of the nth cell of the atlas
+    page, n = divmod(n, PAGE_COLUMNS * PAGE_ROWS)
+    return page, (n % PAGE_COLUMNS) * CELL + 5, (n // PAGE_COLUMNS) * CELL + 5
+
+
+def cell_number(page, x, y):
+    # inverse of cell_position
+    return page * PAGE_COLUMNS * PAGE_ROWS + (y - 5) // CELL * PAGE_COLUMNS + (x - 5) // CELL
+
+
+def upscale(cell):
+    # resize((32, 32), Image.NEAREST); a plain repeat for the 8, 16 and 32 pixel tiles most sheets are made of
+    if 32 % cell.shape[0]:
+        return np.asarray(Image.fromarray(cell).resize((32, 32), Image.NEAREST))
+    scale = 32 // cell.shape[0]
+    return cell.repeat(scale, axis=0).repeat(scale, axis=1)
+
+
+def sprite(sprites, index, imagename, imageindex, layout):
+    # a sprite or mask scaled to 32x32 once; dyes and items share a handful of cloth sprites and masks
+    key = (imagename, imageindex, layout)
+    if key not in sprites:
+        sprites[key] = upscale(index.tile(imagename, imageindex, layout))
+    return sprites[key]
+
+
+def dye_fill(dyes, index, tex):
+    # the 40x40 fill a Tex1/Tex2 value paints through a mask: a colour, or a textile pattern repeated over
+    # the sprite area. Built once per value and shared by every item dyed with it
+    if tex not in dyes:
+        fill = np.zeros((40, 40, 4), np.uint8)
+        fill[:, :, 3] = 255
+        a,r,g,b = argb_split(tex)
+        if a == 1: #color
+            fill[:, :, :3] = (r, g, b)
+        elif r > 0 or g > 0: #invalid texture
+            fill[:, :, :3] = np.asarray(Image.open(ERROR_PNG).convert("RGB"))
+        else: #texture
+            cell = index.tile(f"textile{a}x{a}", b, Layout(a, True, 1))[:, :, :3]
+            fill[4:36, 4:36, :3] = np.tile(cell, (32 // a + 1, 32 // a + 1, 1))[:32, :32]
+        dyes[tex] = fill
+    return dyes[tex]
+
+
+def div255(a):
+    # integer a / 255 exactly as Pillow rounds it when blending
+    a = a + 128
+    return ((a >> 8) + a) >> 8
+
+
+def blend(dst, src, mask):
+    # Image.paste(src, box, mask) onto dst
+    return div255(dst * (255 - mask) + src * mask)
+
+
+def max_filter3(a):
+    # ImageFilter.MaxFilter(3) over the last two axes
+    padded = np.pad(a, ((0, 0), (1, 1), (1, 1)), mode="edge")
+    return sliding_window_view(padded, (3, 3), axis=(1, 2)).max(axis=(-2, -1))
+
+
+def box_blur7(a):
+    # ImageFilter.BoxBlur(7): a horizontal then a vertical 15px box with edge pixels repeated,
+    # each pass rounded back to 8 bits with Pillow's 24-bit fixed point weight
+    weight = (1 << 24) // 15
+    for axis in (2, 1):
+        padding = [(0, 0)] * 3
+        padding[axis] = (7, 7)
+        padded = np.pad(a, padding, mode="edge")
+        a = (sliding_window_view(padded, 15, axis=axis).sum(axis=-1) * weight + (1 << 23)) >> 24
+    return a
+
+
+def composite_tiles(index, tiles, metrics=None):
+    # draw tiles into (n, 45, 45, 4) cells in batches. Sprites, masks and dye fills are gathered
+    # into arrays and the outline, shadow and mask compositing runs over the whole batch at once.
+    # Each step reproduces the integer maths of the Pillow call it stands in for, so a tile comes out
+    # pixel for pixel the same as pasting it with Pillow. Sheets are read as RGBA; the asset server
+    # only ships RGBA sheets, other modes are converted first
+    cells = np.zeros((len(tiles), CELL, CELL, 4), np.uint8)
+    sprites = {}
+    dyes = {}
+    for start in range(0, len(tiles), TILE_BATCH):
+        batch = tiles[start:start + TILE_BATCH]
+        icons = np.zeros((len(batch), 40, 40, 4), np.uint32)
+        masks = np.zeros((len(batch), 40, 40, 4), np.uint32)
+        fills = np.zeros((len(batch), 40, 40, 4), np.uint32)
+        with timed(metrics, "crop"):
+            for i, tile in enumerate(batch):
+                imagename, imageindex, maskname, maskindex, tex, num = tile
+                icons[i, 4:36, 4:36] = sprite(sprites, index, imagename, imageindex, index.layout(imagename))
+                if maskname is not None:
+                    masks[i, 4:36, 4:36] = sprite(sprites, index, maskname, maskindex, index.mask_layout(maskname, imagename))
+                    fills[i] = dye_fill(dyes, index, tex)
+
+        with timed(metrics, "filter"):
+            alpha = icons[..., 3]
+            edges = max_filter3(alpha)
+            shadow = box_blur7(edges) // 2
+        with timed(metrics, "mask"):
+            out = np.zeros_like(icons)
+            out[..., 3] = shadow
+            out[..., 3] = blend(out[..., 3], 255, edges)
+            out = blend(out, icons, alpha[..., None])
+            # only masked tiles are dyed; a zero mask leaves the others exactly as they are
+            dyed = [i for i, tile in enumerate(batch) if tile[2] is not None]
+            if dyed:
+                mask = masks[dyed]
+                fill = fills[dyed]
+                cloth = blend(out[dyed], BLACK, mask[..., 3:])
+                cloth = blend(cloth, fill, mask[..., 0:1])
+                out[dyed] = blend(cloth, fill, mask[..., 1:2])
+            cells[start:start + len(batch), :40, :40] = out
+
+        with timed(metrics, "text"):
+            for i, tile in enumerate(batch):
+                if tile[5] is not None:
+                    cell = Image.fromarray(cells[start + i])
+                    draw_quantity(ImageDraw.Draw(cell), tile[5], 0, 0)
+                    cells[start + i] = np.asarray(cell)
+    return cells
+
+
+def draw_quantity(draw, num, x, y):
+    draw.text((x + 3 - 1, y + 3 - 1), num, fill="#000")
+    draw.text((x + 3 - 1, y + 3 - 0), num, fill="#000")
+    draw.text((x + 3 - 1, y + 3 + 1), num, fill="#000")
+    draw.text((x + 3 - 0, y + 3 - 1), num, fill="#000")
+    draw.text((x + 3 - 0, y + 3 + 1), num, fill="#000")
+    draw.text((x + 3 + 1, y + 3 - 1), num, fill="#000")
+    draw.text((x + 3 + 1, y + 3 - 0), num, fill="#000")
+    draw.text((x + 3 + 1, y + 3 + 1), num, fill="#000")
+    draw.text((x + 3 - 0, y + 3 - 0), num, fill="#fff")
+
+
+def cell_digest(cell):
+    # identifies a cell's pixels without keeping them
+    return hashlib.blake2b(cell, digest_size=16).digest()
+
+
+class AtlasWriter:
+    """The atlas pages as PNG files, written a band of cells at a time.
+
+    Cells are placed in slot order. Only the row of 100 cells being filled is held as pixels; once a later
+    slot comes in it is encoded onto its page and cleared for the next row.
+
+    With previous (a PreviousBuild encoded with the same PNG settings), a cell placed with the position it
+    had in previous as its origin leaves its page unchanged. Bands of unchanged cells are not encoded; a page
+    that ends up holding exactly the cells previous had on it is copied from previous as it is, and one that
+    does not has its skipped bands encoded from the previous page once the first changed cell comes in.
+    """
+
+    def __init__(self, compress_level=6, optimize=False, metrics=None, previous=None):
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.metrics = metrics
+        self.pages = []
+        self.copied = 0
+        self._page = None
+        self._band = 0
+        self._pixels = np.zeros((CELL, PAGE_COLUMNS * CELL + 5, 4), np.uint8)
+        self.previous = None
+        if previous is not None and previous.manifest.get("png") == [compress_level, optimize]:
+            self.previous = previous
+            # cells on every previous page, error.png included
+            self._counts = Counter(page for page, x, y in set(previous.tiles.values()))
+            self._counts[0] += 1
+        self._start_page(0)
+
+    def _start_page(self, page):
+        self._clean = self.previous is not None and page < len(self.previous.pages)
+        # (row, x of the cells placed on it) of every band of the page not encoded yet
+        self._skipped = []
+        self._placed = []
+        self._count = 0
+
+    def place(self, slot, cell, origin=None):
+        """Put cell in slot; origin is the page, x, y the same pixels had in the previous build, if any."""
+        page, x, y = cell_position(slot)
+        band = page * PAGE_ROWS + (y - 5) // CELL
+        if band < self._band:
+            raise ValueError(f"slot {slot} placed after a later row was written; cells must be placed in slot order")
+        while self._band < band:
+            # a row with cells after it is always a full-width row
+            self.write_band(self._pixels.shape[1])
+        if self._clean and origin != (page, x, y):
+            self._encode_skipped()
+        self._pixels[:, x:x + CELL] = cell
+        self._placed.append(x)
+
+    def _encode_skipped(self):
+        # the page changed after all; encode the bands skipped so far from the previous page
+        self._clean = False
+        if not self._skipped:
+            return
+        old = self.previous.page(len(self.pages))
+        with timed(self.metrics, "encode"):
+            self._page = PngWriter(self._width, self.compress_level, self.optimize)
+            self._page.write(np.zeros((5, self._width, 4), np.uint8))
+            for row, placed in self._skipped:
+                band = np.zeros((CELL, self._width, 4), np.uint8)
+                for x in placed:
+                    band[:, x:x + CELL] = old[row * CELL + 5:(row + 1) * CELL + 5, x:x + CELL]
+                self._page.write(band)
+        self._skipped = []
+
+    def write_band(self, width):
+        page, row = divmod(self._band, PAGE_ROWS)
+        if row == 0:
+            self._width = width
+        if self._clean:
+            self._skipped.append((row, self._placed))
+        else:
+            with timed(self.metrics, "encode"):
+                if row == 0:
+                    self._page = PngWriter(width, self.compress_level, self.optimize)
+                    self._page.write(np.zeros((5, width, 4), np.uint8))
+                self._page.write(self._pixels[:, :width])
+        self._count += len(self._placed)
+        self._placed = []
+        self._pixels[:] = 0
+        self._band += 1
+        if row == PAGE_ROWS - 1:
+            self._finish_page(page)
+
+    def _finish_page(self, page):
+        if self._clean:
+            old = self.previous.pages[page]
+            # the IHDR width and height, and the number of cells, say whether the page holds nothing else
+            if struct.unpack(">II", old[16:24]) == (self._width, len(self._skipped) * CELL + 5) and self._count == self._counts[page]:
+                self.pages.append(old)
+                self.copied += 1
+                self._start_page(page + 1)
+                return
+            self._encode_skipped()
+        with timed(self.metrics, "encode"):
+            self.pages.append(self._page.finish())
+        self._page = None
+        self._start_page(page + 1)
+
+    def finish(self, count):
+        """Write out the rows up to the last of count slots and return the PNG files of the pages."""
+        page, x, y = cell_position(count - 1)
+        last = page * PAGE_ROWS + (y - 5) // CELL
+        while self._band < last:
+            self.write_band(self._pixels.shape[1])
+        self.write_band(min(count - page * PAGE_COLUMNS * PAGE_ROWS, PAGE_COLUMNS) * CELL + 5)
+        if len(self.pages) == page:
+            self._finish_page(page)
+        return self.pages
+
+
+def render_atlas(source, assets, previous=None, metrics=None, compress_level=6, optimize=False, pool=None, stable_slots=False):
+    """Draw and encode the atlas pages for parse_assets() output and fill in the page, x and y of every item.
+
+    Every distinct tile is drawn once, and items whose tiles come out pixel for pixel the same share a
+    cell. Cells are laid out 100 to a row and 100 rows to a page; each page is cropped to what it holds.
+    Pages are encoded as PNG (compress_level, optimize as in Pillow) while they are drawn, a row of cells
+    at a time, so memory does not grow with the size of the atlas. With a pool (a JobPool) tiles are drawn
+    on its worker processes, and the cells are placed in the same order as without one.
+
+    Tiles previous drew are copied from its pages instead of being drawn again; the atlas still comes out
+    exactly as a build without previous would lay it out. With stable_slots cells instead stay where
+    previous put them, which keeps a delta between the two builds small.
+    """
+    index = SpriteIndex(source)
+    keys = {}
+    unique = []
+    for item, tile in assets.cells:
+        for sheet in tile_sheets(tile):
+            source.sheet_hash(sheet)
+        key = tile_key(tile, index)
+        if key not in keys:
+            keys[key] = len(unique)
+            unique.append(tile)
+    hits = len(assets.cells) - len(unique)
+
+    writer = AtlasWriter(compress_level, optimize, metrics, previous)
+    error = np.zeros((CELL, CELL, 4), np.uint8)
+    error[:40, :40, :3] = np.asarray(Image.open(ERROR_PNG).convert("RGB"))
+    error[:40, :40, 3] = 255
+    writer.place(1, error, cell_position(1))
+
+    # tiles the previous build already drew are cut out of its pages, the rest are composited a batch at
+    # a time. Cells with identical pixels go into the atlas once. Normally cells take the next free slot
+    # as they are drawn and go straight to the writer; with stable_slots, cells are kept until every cell
+    # is known and the slots are worked out
+    stable_slots = stable_slots and previous is not None
+    found = [previous_cell(previous, source, tile, index) for tile in unique]
+    reused = sum(cell is not None for cell in found)
+    batches = [[tile for tile, cell in zip(unique[start:start + TILE_BATCH], found[start:start + TILE_BATCH]) if cell is None] for start in range(0, len(unique), TILE_BATCH)]
+    if pool is None:
+        drawn = (composite_tiles(index, tiles, metrics) for tiles in batches)
+    else:
+        drawn = pool.composite(index, source, batches)
+
+    digests = []
+    groups = {}
+    slots = {}
+    kept = {}
+    free = RESERVED_CELLS
+    for start, batchcells in zip(range(0, len(unique), TILE_BATCH), drawn):
+        batch = unique[start:start + TILE_BATCH]
+        cells = np.zeros((len(batch), CELL, CELL, 4), np.uint8)
+        pending = [i for i in range(len(batch)) if found[start + i] is None]
+        for i in range(len(batch)):
+            if found[start + i] is not None:
+                cells[i] = previous.cell(*found[start + i])
+        cells[pending] = batchcells
+        for i, cell in enumerate(cells):
+            digest = cell_digest(cell)
+            digests.append(digest)
+            if digest in groups:
+                groups[digest].append(start + i)
+                continue
+            groups[digest] = [start + i]
+            if not stable_slots:
+                slots[digest] = free
+                writer.place(free, cell, found[start + i])
+                free += 1
+            elif found[start + i] is None:
+                kept[digest] = cell.copy()
+            else:
+                kept[digest] = found[start + i]
+    shared = len(unique) - len(groups)
+
+    if stable_slots:
+        # cells stay where the previous build put them, so items keep their x and y and a delta between the
+        # builds only carries what changed; new cells fill the holes left by removed ones before the atlas grows
+        taken = set(range(RESERVED_CELLS))
+        for digest, members in groups.items():
+            wanted = sorted(cell_number(*previous.tiles[tuple(unique[i])]) for i in members if tuple(unique[i]) in previous.tiles)
+            for slot in wanted:
+                if slot not in taken:
+                    slots[digest] = slot
+                    taken.add(slot)
+                    break
+        for digest in groups:
+            if digest not in slots:
+                while free in taken:
+                    free += 1
+                slots[digest] = free
+                taken.add(free)
+        for digest in sorted(slots, key=slots.get):
+            cell = kept.pop(digest)
+            if isinstance(cell, np.ndarray):
+                writer.place(slots[digest], cell)
+            else:
+                writer.place(slots[digest], previous.cell(*cell), cell)
+    pages = writer.finish(max(slots.values(), default=RESERVED_CELLS - 1) + 1)
+
+    positions = [cell_position(slots[digest]) for digest in digests]
+    tiles = []
+    for item, tile in assets.cells:
+        page, x, y = positions[keys[tile_key(tile, index)]]
+        tiles.append([page, x, y, tile])
+        item.x = x
+        item.y = y
+        item.page = page
+
+    return Atlas(pages, tiles, hits, len(unique), reused, shared, index.digest, [compress_level, optimize], writer.copied)
@@ -0,0 +1,261 @@
+"""Time each stage of a build on synthetic asset trees and keep the results to compare commits.
+
+    python -m muledump_render.bench --scales 1000 10000 --repeat 3
+    python -m muledump_render.bench --check
+
+Every run is appended to bench-results.jsonl (see --results) together with the git commit it ran on, and
+compared with the last stored run of the same scale from another commit. --check instead draws random
+tiles with composite_tiles() and with the Pillow calls it replaces, and fails unless every pixel matches.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from . import VERSION
+
+STAGES = ["gather", "parse", "render", "encode", "constants", "sheets"]
+RESULTS = "bench-results.jsonl"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_build(root, dest):
+    # one cold build with a fresh Source, timed stage by stage
+    from .assets import parse_assets
+    from .atlas import render_atlas
+    from .metrics import Metrics
+    from .output import write_constants, write_sheets
+    from .source import Source, gather_sources
+
+    timings = {}
+    source = Source(root)
+    try:
+        start = time.perf_counter()
+        xmlfiles = gather_sources(source)
+        for href, future in xmlfiles:
+            future.result()
+        timings["gather"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assets = parse_assets(xmlfiles)
+        timings["parse"] = time.perf_counter() - start
+
+        # pages are encoded while they are drawn; the time spent encoding is taken out of render
+        metrics = Metrics()
+        start = time.perf_counter()
+        atlas = render_atlas(source, assets, metrics=metrics)
+        timings["encode"] = metrics.phases.get("encode", 0)
+        timings["render"] = time.perf_counter() - start - timings["encode"]
+
+        start = time.perf_counter()
+        write_constants(dest, assets)
+        timings["constants"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        write_sheets(dest, source, assets, atlas.pages)
+        timings["sheets"] = time.perf_counter() - start
+    finally:
+        source.close()
+    return timings
+
+
+class ArraySource:
+    # the part of a Source a SpriteIndex uses, over sheets held as arrays and without a manifest.xml
+
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def fetch(self, path):
+        raise FileNotFoundError(path)
+
+    def load_image(self, imagename):
+        return self.sheets[imagename]
+
+
+def random_sheet(rng, width, height):
+    # RGBA noise with every alpha from fully transparent to opaque, and transparent holes like real sprites have
+    sheet = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    sheet[rng.random((height, width)) < 0.3, 3] = 0
+    sheet[rng.random((height, width)) < 0.3, 3] = 255
+    return sheet
+
+
+def pillow_cell(sheets, tile):
+    # one tile drawn onto an empty cell with the Pillow calls render.py used before composite_tiles()
+    from PIL import Image, ImageDraw, ImageFilter, ImageOps
+    from .assets import argb_split
+    from .atlas import CELL, ERROR_PNG, draw_quantity
+
+    imagename, imageindex, maskname, maskindex, tex, num = tile
+    size = 16 if "16" in imagename else 8
+
+    def crop(name, index, size):
+        img = Image.fromarray(sheets[name])
+        srcw = img.size[0] / size
+        srcx, srcy = size * (index % srcw), size * (index // srcw)
+        return img.crop((srcx, srcy, srcx + size, srcy + size)).resize((32, 32), Image.NEAREST)
+
+    cell = Image.new("RGBA", (CELL, CELL))
+    allblack = Image.new("RGBA", (40, 40), "BLACK")
+    icon = ImageOps.expand(crop(imagename, imageindex, size), 4)
+    edges = icon.split()[-1].filter(ImageFilter.MaxFilter(3))
+    shadow = edges.filter(ImageFilter.BoxBlur(7)).point(lambda alpha: alpha // 2)
+    cell.paste(allblack, (0, 0), shadow)
+    cell.paste(allblack, (0, 0), edges)
+    icon = icon.crop((1, 1, 39, 39))
+    cell.paste(icon, (1, 1), icon)
+    if maskname is not None:
+        mask = ImageOps.expand(crop(maskname, maskindex, size), 4)
+        a, r, g, b = argb_split(tex)
+        if a == 1:
+            img = Image.new("RGB", (40, 40), (r, g, b))
+        elif r > 0 or g > 0:
+            img = Image.open(ERROR_PNG)
+        else:
+            img = Image.fromarray(sheets[f"textile{a}x{a}"])
+            srcw = img.size[0] / a
+            srcx, srcy = a * (b % srcw), a * (b // srcw)
+            img = img.crop((srcx, srcy, srcx + a, srcy + a)).convert("RGB")
+            pattern = Image.new("RGB", (a * 10, a * 10))
+            for y in range(10):
+                for x in range(10):
+                    pattern.paste(img, (x * a, y * a))
+            img = ImageOps.expand(pattern.crop((0, 0, 32, 32)), 4)
+        cell.paste(allblack, (0, 0), mask)
+        cell.paste(img, (0, 0), mask.split()[0])
+        cell.paste(img, (0, 0), mask.split()[1])
+    if num is not None:
+        draw_quantity(ImageDraw.Draw(cell), num, 0, 0)
+    return np.asarray(cell)
+
+
+def check_compositing(count=500, seed=0):
+    """Draw count random tiles with composite_tiles() and with Pillow; returns the tiles that differ."""
+    from .atlas import composite_tiles
+    from .sprites import SpriteIndex
+
+    rng = np.random.default_rng(seed)
+    sheets = {
+        "lofiObj": random_sheet(rng, 64, 64),
+        "lofiObjMask": random_sheet(rng, 64, 64),
+        "lofiObj16": random_sheet(rng, 128, 64),
+        "lofiObj16Mask": random_sheet(rng, 128, 64),
+        "textile4x4": random_sheet(rng, 32, 32),
+        "textile10x10": random_sheet(rng, 50, 50),
+    }
+    tiles = []
+    for _ in range(count):
+        imagename = "lofiObj16" if rng.random() < 0.5 else "lofiObj"
+        tiles_on_sheet = 32 if imagename == "lofiObj16" else 64
+        maskname = maskindex = tex = num = None
+        if rng.random() < 0.7:
+            maskname = f"{imagename}Mask"
+            maskindex = int(rng.integers(tiles_on_sheet))
+            kind = rng.integers(3)
+            if kind == 0:
+                tex = 0x01000000 | int(rng.integers(1 << 24))
+            elif kind == 1:
+                a = 4 if rng.random() < 0.5 else 10
+                tex = (a << 24) | int(rng.integers((32 // a) ** 2 if a == 4 else 25))
+            else:
+                tex = 0x04010000
+        if rng.random() < 0.2:
+            num = str(int(rng.integers(1, 100)))
+        tiles.append((imagename, int(rng.integers(tiles_on_sheet)), maskname, maskindex, tex, num))
+
+    cells = composite_tiles(SpriteIndex(ArraySource(sheets)), tiles)
+    return [tile for tile, cell in zip(tiles, cells) if not np.array_equal(cell, pillow_cell(sheets, tile))]
+
+
+def run_scale(items, repeat, seed):
+    # the best of `repeat` builds per stage, which is the least noisy number on a shared machine
+    from .synthetic import generate_assets
+    with tempfile.TemporaryDirectory() as tmp:
+        root = f"{tmp}/assets"
+        dest = f"{tmp}/out"
+        os.makedirs(dest)
+        generate_assets(root, items, seed)
+        best = {}
+        for _ in range(repeat):
+            for stage, seconds in time_build(root, dest).items():
+                best[stage] = min(best.get(stage, seconds), seconds)
+    return best
+
+
+def load_results(path):
+    results = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    results.append(json.loads(line))
+    return results
+
+
+def baseline(results, commit, items):
+    # the latest stored run of the same scale that was not made on this commit
+    for result in reversed(results):
+        if result["items"] == items and (commit is None or result["commit"] != commit):
+            return result
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the render stages on synthetic assets')
+    parser.add_argument('--scales', type=int, nargs='+', help='numbers of atlas items to benchmark', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, help='builds per scale; the fastest time of each stage is kept', default=3)
+    parser.add_argument('--seed', type=int, help='random seed for the synthetic assets', default=0)
+    parser.add_argument('--results', type=str, help='file the results are appended to', default=RESULTS)
+    parser.add_argument('--no-save', action='store_true', help='only print the results')
+    parser.add_argument('--check', action='store_true', help='check that tile compositing matches Pillow pixel for pixel, then exit')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = check_compositing(seed=args.seed)
+        for tile in mismatches[:10]:
+            print(f"  differs from Pillow: {tile}")
+        print(f"+ Compositing: {len(mismatches)} tiles differ from Pillow")
+        raise SystemExit(1 if mismatches else 0)
+
+    commit = git_commit()
+    results = load_results(args.results)
+    for items in args.scales:
+        stages = run_scale(items, args.repeat, args.seed)
+        result = {
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "version": VERSION,
+            "python": platform.python_version(),
+            "items": items,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "stages": stages,
+        }
+        previous = baseline(results, commit, items)
+        print(f"{items} items" + (f" (compared with {previous['commit']})" if previous else ""))
+        for stage in STAGES:
+            line = f"  {stage:<10} {stages[stage] * 1000:9.1f} ms"
+            if previous is not None and previous["stages"].get(stage):
+                line += f"  {(stages[stage] / previous['stages'][stage] - 1) * 100:+6.1f}%"
+            print(line)
+        total = sum(stages.values())
+        print(f"  {'total':<10} {total * 1000:9.1f} ms")
+        if not args.no_save:
+            with open(args.results, "a") as fh:
+                fh.write(json.dumps(result) + "\n")
+            results.append(result)
+
+
+if __name__ == "__main__":
+    main()
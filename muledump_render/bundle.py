@@ -0,0 +1,110 @@
+import mmap
+import struct
+import tarfile
+import zipfile
+import zlib
+
+# signature, then the name and extra field lengths at the end of a zip local file header
+LOCAL_HEADER = struct.Struct("<4s22xHH")
+
+
+def asset_root(names):
+    # the directory inside the archive that holds xml/, so bundles with or without a top-level folder both work
+    roots = []
+    for name in names:
+        if name.startswith("xml/"):
+            roots.append("")
+        elif "/xml/" in name:
+            roots.append(name[:name.index("/xml/") + 1])
+    return min(roots, key=len) if roots else ""
+
+
+def is_bundle(path):
+    # whether path is an archive Bundle can read: a zip file or a tar, compressed or not
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+
+class Bundle:
+    """A zip or tar archive of an asset tree, read in place instead of being extracted.
+
+    Zip files and uncompressed tars are memory mapped and their members sliced straight out of the map,
+    inflating deflated zip members on the way. Compressed tars cannot be read at random,
+    so their files are inflated into memory once when the bundle is opened. Paths are relative to the
+    directory in the archive that holds xml/, and listdir() keeps the order of the archive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._zip = None
+        self._members = {}
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if zipfile.is_zipfile(self._map):
+            # zipfile only reads the central directory from the map; members are sliced out of it in read()
+            self._zip = zipfile.ZipFile(self._map)
+            self._members = {info.filename: info for info in self._zip.infolist() if not info.is_dir()}
+            names = list(self._members)
+        else:
+            try:
+                self._map.seek(0)
+                with tarfile.open(fileobj=self._map, mode="r:") as tar:
+                    # name -> (offset, size) of its data in the map
+                    for member in tar:
+                        if member.isfile():
+                            self._members[member.name] = (member.offset_data, member.size)
+            except tarfile.ReadError:
+                self._map.close()
+                self._map = None
+                self._members = {}
+                try:
+                    with tarfile.open(path, "r:*") as tar:
+                        for member in tar:
+                            if member.isfile():
+                                self._members[member.name] = tar.extractfile(member).read()
+                except tarfile.ReadError as e:
+                    raise ValueError(f"{path} is neither a directory nor a .zip/.tar bundle") from e
+            names = list(self._members)
+        self.names = [name[2:] if name.startswith("./") else name for name in names]
+        self.root = asset_root(self.names)
+        self._paths = {name[len(self.root):]: member for name, member in zip(self.names, names) if name.startswith(self.root)}
+
+    def listdir(self, directory):
+        """Names of the files directly in directory, in archive order."""
+        prefix = f"{directory}/"
+        return [path[len(prefix):] for path in self._paths if path.startswith(prefix) and "/" not in path[len(prefix):]]
+
+    def read(self, path):
+        if path not in self._paths:
+            raise FileNotFoundError(f"{self.path}: no {path}")
+        data = self._members[self._paths[path]]
+        if isinstance(data, zipfile.ZipInfo):
+            return self.read_zip(data)
+        if isinstance(data, tuple):
+            offset, size = data
+            return self._map[offset:offset + size]
+        return data
+
+    def read_zip(self, info):
+        # the local header before the data repeats the name and has its own extra field
+        start = info.header_offset + LOCAL_HEADER.size
+        signature, name_length, extra_length = LOCAL_HEADER.unpack(self._map[info.header_offset:start])
+        if signature != b"PK\x03\x04":
+            raise zipfile.BadZipFile(f"{self.path}: bad local header for {info.filename}")
+        start += name_length + extra_length
+        data = self._map[start:start + info.compress_size]
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+        elif info.compress_type != zipfile.ZIP_STORED:
+            # bzip2 and lzma members are rare enough to go through zipfile on a file of their own
+            with zipfile.ZipFile(self.path) as z:
+                return z.read(info)
+        if zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f"{self.path}: bad CRC for {info.filename}")
+        return data
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._map is not None:
+            self._map.close()
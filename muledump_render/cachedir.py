@@ -0,0 +1,41 @@
+import os
+
+
+def cache_dir(name):
+    """The default directory of a persistent cache: ~/.cache/muledump-render/<name>, or under $XDG_CACHE_HOME."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "muledump-render", name)
+
+
+def touch(path):
+    # mark a cache file as just used; evict_files() drops the files used longest ago first
+    try:
+        os.utime(path)
+    except OSError:
+        # evicted by another run in the meantime
+        pass
+
+
+def evict_files(directory, suffix, max_size):
+    """Delete the least recently used files ending in suffix from directory until the rest take at most max_size bytes."""
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(suffix) and entry.is_file():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for used, size, path in files)
+    for used, size, path in sorted(files):
+        if total <= max_size:
+            break
+        # another run that still wants this file just has to make it again
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # still open somewhere, e.g. a sheet another process has memory mapped on Windows
+            continue
+        total -= size
@@ -0,0 +1,150 @@
+import argparse
+import os
+
+from . import VERSION
+
+
+def main(argv=None):
+    # create an ArgumentParser object
+    parser = argparse.ArgumentParser(description='Example script for parsing command line arguments')
+
+    # add the command line arguments
+    parser.add_argument('--version', action='store_true', help='show version and exit')
+    parser.add_argument('--game-version', type=str, help='game version', default="0.0.0.0.0")
+    parser.add_argument('--buildhash', type=str, help='game buildhash', default="")
+    parser.add_argument('--dest', type=str, help='destination')
+    parser.add_argument('--source', type=str, help='source for file list; local path (e.g. /path/to/assets), .zip or .tar bundle of one, or remote url (e.g. https://assets.muledump.com/)', default="https://assets.muledump.com")
+    parser.add_argument('--debug', action='store_true', help='enable debugging')
+    parser.add_argument('--incremental', action='store_true', help='reuse unchanged xml and atlas tiles from the previous build in --dest')
+    parser.add_argument('--jobs', type=int, help='worker processes that parse xml and draw atlas tiles; 1 does everything in this process', default=1)
+    parser.add_argument('--fetch-workers', type=int, help='maximum number of concurrent downloads', default=16)
+    parser.add_argument('--http-cache', type=str, help='directory of the persistent download cache (default: ~/.cache/muledump-render/http)')
+    parser.add_argument('--http-cache-size', type=int, help='megabytes the download cache may use before old files are evicted', default=1024)
+    parser.add_argument('--no-http-cache', action='store_true', help='download everything without the persistent cache')
+    parser.add_argument('--parse-cache', type=str, help='directory of parsed xml records kept between runs (default: ~/.cache/muledump-render/parse)')
+    parser.add_argument('--parse-cache-size', type=int, help='megabytes the parse cache may use before old files are evicted', default=256)
+    parser.add_argument('--no-parse-cache', action='store_true', help='parse every xml file without the persistent cache')
+    parser.add_argument('--sheet-cache', type=str, help='directory to keep decoded sprite sheets in between runs')
+    parser.add_argument('--sheet-cache-size', type=int, help='megabytes the --sheet-cache directory may use before old files are evicted', default=1024)
+    parser.add_argument('--sheet-memory', type=int, help='megabytes of decoded sprite sheets to hold in memory at once', default=256)
+    parser.add_argument('--png-compress-level', type=int, choices=range(10), metavar='0-9', help='zlib level for renders.png; lower is faster, higher is smaller', default=6)
+    parser.add_argument('--png-optimize', action='store_true', help='encode renders.png at zlib level 9 and also try the Average filter on every row, as Pillow\'s optimize does (slow)')
+    parser.add_argument('--sheets', choices=['inline', 'external'], help='inline images in sheets.js as data: URIs, or write them as content-hashed files under --dest/sheets', default='inline')
+    parser.add_argument('--trim-sheets', action='store_true', help='embed only the skin and pet skin sprites that are used and recompress the sheets in sheets.js')
+    parser.add_argument('--png-cache', type=str, help='directory of sheets recompressed by --trim-sheets (default: ~/.cache/muledump-render/png)')
+    parser.add_argument('--png-cache-size', type=int, help='megabytes the --trim-sheets cache may use before old files are evicted', default=64)
+    parser.add_argument('--metrics', type=str, help='write a JSON report of stage timings, cache hit rates, memory and output sizes to this file')
+    parser.add_argument('--profile', type=str, help='run under cProfile and write the pstats dump to this file')
+    parser.add_argument('--watch', action='store_true', help='keep running and rebuild whenever a local --source changes')
+    parser.add_argument('--delta-from', type=str, help='directory of an older build; write what changed since it to --dest/delta')
+
+    # parse the command line arguments
+    args = vars(parser.parse_args(argv))
+
+    # print("args", args)
+
+    # show version
+    if args["version"]:
+        print(f"Muledump Render v{VERSION}")
+        exit()
+
+    if args["dest"] is None:
+        print(f"Missing required parameter: --dest")
+        exit(1)
+
+    print("Muledump Render starting ...")
+
+    from .manifest import load_previous
+    from .pipeline import build
+    from .source import Source
+
+    # load the previous build before cleaning it up; its tiles are copied out of the old renders.png
+    previous = load_previous(args["dest"]) if args["incremental"] else None
+
+    # likewise the build the delta starts from, which may be --dest itself
+    old_outputs = None
+    if args["delta_from"]:
+        if args["watch"]:
+            print(f"--delta-from cannot be used with --watch")
+            exit(1)
+        from .delta import Outputs
+        old_outputs = Outputs(args["delta_from"])
+        # its manifest keeps unchanged atlas cells in place, which is what keeps the delta small
+        if previous is None:
+            previous = load_previous(args["delta_from"])
+
+    # clean up before we begin
+    if not args["debug"]:
+        if os.path.exists(f"{args['dest']}/constants.js"):
+            os.remove(f"{args['dest']}/constants.js")
+
+        if os.path.exists(f"{args['dest']}/renders.png"):
+            os.remove(f"{args['dest']}/renders.png")
+
+        if os.path.exists(f"{args['dest']}/sheets.js"):
+            os.remove(f"{args['dest']}/sheets.js")
+
+    if os.path.isfile(args["source"]):
+        from .bundle import is_bundle
+        if not is_bundle(args["source"]):
+            print(f"--source is neither a directory nor a .zip/.tar bundle")
+            exit(1)
+
+    if args["watch"] and not os.path.isdir(args["source"]):
+        print(f"--watch needs a local --source")
+        exit(1)
+
+    http_cache = None
+    if not args["no_http_cache"] and args["source"].startswith("http"):
+        from .httpcache import HttpCache
+        http_cache = HttpCache(args["http_cache"], args["http_cache_size"] * 1024 * 1024)
+
+    from .cachedir import cache_dir
+    from .parsecache import ParseCache
+    parse_cache = ParseCache(None if args["no_parse_cache"] else args["parse_cache"] or cache_dir("parse"), args["parse_cache_size"] * 1024 * 1024)
+
+    source = Source(args["source"], fetch_workers=args["fetch_workers"], sheet_cache_dir=args["sheet_cache"], sheet_memory_limit=args["sheet_memory"] * 1024 * 1024, sheet_cache_size=args["sheet_cache_size"] * 1024 * 1024, http_cache=http_cache)
+    options = {
+        "compress_level": args["png_compress_level"],
+        "optimize": args["png_optimize"],
+        "external_sheets": args["sheets"] == "external",
+        "metrics": args["metrics"],
+        "parse_cache": parse_cache,
+        "pool": None,
+        "trim_sheets": args["trim_sheets"],
+        "png_cache": None,
+        "stable_slots": old_outputs is not None,
+    }
+    if args["trim_sheets"]:
+        from .pngcache import PngCache
+        options["png_cache"] = PngCache(args["png_cache"] or cache_dir("png"), args["png_cache_size"] * 1024 * 1024)
+    if args["jobs"] > 1:
+        from .jobs import JobPool
+        options["pool"] = JobPool(args["jobs"])
+    if args["profile"]:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        if args["watch"]:
+            from .watch import watch
+            watch(source, args["dest"], args["game_version"], args["buildhash"], previous, **options)
+        else:
+            build(source, args["dest"], args["game_version"], args["buildhash"], previous, **options)
+            if old_outputs is not None:
+                from .delta import make_delta
+                cells = make_delta(old_outputs, Outputs(args["dest"]), f"{args['dest']}/delta", options["compress_level"], options["optimize"])
+                print(f"+ Wrote delta from {args['delta_from']} ({cells} new atlas cells)")
+    finally:
+        source.close()
+        parse_cache.close()
+        if options["png_cache"] is not None:
+            options["png_cache"].close()
+        if options["pool"] is not None:
+            options["pool"].close()
+        if args["profile"]:
+            profiler.disable()
+            profiler.dump_stats(args["profile"])
+            print(f"+ Wrote profile to {args['profile']}")
+
+    print("")
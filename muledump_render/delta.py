@@ -0,0 +1,318 @@
+"""Patches between two builds' outputs, and the step that applies them.
+
+    python -m muledump_render.delta make /path/to/old /path/to/new /path/to/delta
+    python -m muledump_render.delta apply /path/to/old /path/to/delta /path/to/out
+
+A delta directory holds delta.json, delta.png and delta.js. delta.json lists the entries added, changed or
+removed in every table of constants.js and sheets.js. It also has the new atlas page sizes and the cells
+that changed: each is either copied from where the same pixels sat in the old atlas, or taken from
+delta.png, a strip holding only the new cell pixels. delta.js applies the constants.js changes to the old
+tables in a browser. With --sheets external, sheet files the old build does not have are copied to
+sheets/ in the delta.
+"""
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+from PIL import Image
+
+from .atlas import CELL, cell_digest
+from .output import SHEETS_DIR, atomic_write, renders_filename, write_data_uri, write_renders, write_renders_pages
+
+DELTA_VERSION = 1
+STRIP_COLUMNS = 100
+TABLE_START = re.compile(r"^(\w+) = \{\n$")
+
+
+class Outputs:
+    """The constants.js, sheets.js and atlas pages of one build, read from a directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(f"{path}/constants.js") as f:
+            self.constants = f.read()
+        with open(f"{path}/sheets.js") as f:
+            self.sheets = f.read()
+        self.pages = []
+        while os.path.exists(f"{path}/{renders_filename(len(self.pages))}"):
+            self.pages.append(np.asarray(Image.open(f"{path}/{renders_filename(len(self.pages))}").convert("RGBA")))
+
+
+def split_tables(text):
+    # text to a frame of plain lines and ("table", name) markers, plus {name: {key: value}} in file order
+    frame = []
+    tables = {}
+    table = None
+    for line in text.splitlines(keepends=True):
+        if table is not None:
+            if line.startswith("  "):
+                key, value = line[2:].rstrip("\n").rstrip(",").split(": ", 1)
+                tables[table][key] = value
+                continue
+            table = None
+        match = TABLE_START.match(line)
+        frame.append(line)
+        if match:
+            table = match.group(1)
+            tables[table] = {}
+            frame.append(["table", table])
+    return frame, tables
+
+
+def join_tables(frame, tables):
+    lines = []
+    for line in frame:
+        if isinstance(line, list):
+            lines += [f"  {key}: {value},\n" for key, value in tables[line[1]].items()]
+        else:
+            lines.append(line)
+    return "".join(lines)
+
+
+def table_key(key):
+    # constants.js tables are written sorted by their numeric keys; the Empty Slot is written as '-1'
+    return int(key.strip("'"))
+
+
+def merge_table(old, changes):
+    # apply {"set", "remove", "order"} to an old table; without an explicit order numeric keys are sorted
+    # and other keys keep their old order with new ones appended
+    table = {key: value for key, value in old.items() if key not in changes["remove"]}
+    table.update(changes["set"])
+    if changes.get("order") is not None:
+        return {key: table[key] for key in changes["order"]}
+    try:
+        return {key: table[key] for key in sorted(table, key=table_key)}
+    except ValueError:
+        return table
+
+
+def diff_tables(old, new):
+    changes = {}
+    for name, table in new.items():
+        before = old.get(name, {})
+        change = {
+            "set": {key: value for key, value in table.items() if before.get(key) != value},
+            "remove": [key for key in before if key not in table],
+        }
+        if list(merge_table(before, change)) != list(table):
+            change["order"] = list(table)
+        if change["set"] or change["remove"] or "order" in change:
+            changes[name] = change
+    return changes
+
+
+def split_sheets(text):
+    # sheets.js without its renders lines, and the data: URIs or paths of the renders pages
+    frame = []
+    renders = []
+    for line in text.splitlines(keepends=True):
+        if line.startswith("renders = '"):
+            renders.append(line[len("renders = '"):-len("';\n")])
+        elif line.startswith("rendersPages = [renders"):
+            renders += re.findall(r"'([^']*)'", line)
+        else:
+            frame.append(line)
+    return "".join(frame), renders
+
+
+def cells(page):
+    # (x, y) of every cell position on an atlas page
+    for y in range(5, page.shape[0] - CELL + 1, CELL):
+        for x in range(5, page.shape[1] - CELL + 1, CELL):
+            yield x, y
+
+
+def make_delta(old, new, dest, compress_level=6, optimize=False):
+    """Write the delta from the old to the new Outputs into dest; returns the number of cells in delta.png."""
+    os.makedirs(dest, exist_ok=True)
+
+    # atlas: cells whose pixels moved are copied from their old place, only new pixels go into the strip
+    positions = {}
+    for page, pixels in enumerate(old.pages):
+        for x, y in cells(pixels):
+            positions.setdefault(cell_digest(np.ascontiguousarray(pixels[y:y + CELL, x:x + CELL])), [page, x, y])
+    ops = []
+    strip = {}
+    for page, pixels in enumerate(new.pages):
+        before = old.pages[page] if page < len(old.pages) else None
+        for x, y in cells(pixels):
+            cell = pixels[y:y + CELL, x:x + CELL]
+            if before is not None and y + CELL <= before.shape[0] and x + CELL <= before.shape[1]:
+                if np.array_equal(before[y:y + CELL, x:x + CELL], cell):
+                    continue
+            elif not cell.any():
+                continue
+            key = cell_digest(np.ascontiguousarray(cell))
+            if key in positions:
+                ops.append([page, x, y, "old", *positions[key]])
+            else:
+                # strip: {cell_digest: (index, cell)}
+                if key not in strip:
+                    strip[key] = (len(strip), cell)
+                ops.append([page, x, y, "strip", strip[key][0]])
+
+    rows = max(1, -(-len(strip) // STRIP_COLUMNS))
+    image = np.zeros((rows * CELL, min(max(1, len(strip)), STRIP_COLUMNS) * CELL, 4), np.uint8)
+    for n, cell in strip.values():
+        image[(n // STRIP_COLUMNS) * CELL:(n // STRIP_COLUMNS + 1) * CELL, (n % STRIP_COLUMNS) * CELL:(n % STRIP_COLUMNS + 1) * CELL] = cell
+    with atomic_write(f"{dest}/delta.png", "wb") as fh:
+        Image.fromarray(image).save(fh, "PNG", compress_level=compress_level, optimize=optimize)
+
+    constants_frame, constants_tables = split_tables(new.constants)
+    old_constants_frame, old_constants_tables = split_tables(old.constants)
+    sheets_text, renders = split_sheets(new.sheets)
+    sheets_frame, sheets_tables = split_tables(sheets_text)
+    old_sheets_frame, old_sheets_tables = split_tables(split_sheets(old.sheets)[0])
+    external = not renders[0].startswith("data:")
+
+    # files sheets.js points at that the old sheets.js did not travel with the delta; going by the old
+    # sheets.js rather than the old directory lets the new build overwrite the old one before this runs
+    shutil.rmtree(f"{dest}/{SHEETS_DIR}", ignore_errors=True)
+    if external:
+        known = {value for table in old_sheets_tables.values() for value in table.values()}
+        for table in sheets_tables.values():
+            for value in table.values():
+                if value not in known:
+                    filename = value.strip("'")
+                    os.makedirs(os.path.dirname(f"{dest}/{filename}"), exist_ok=True)
+                    shutil.copyfile(f"{new.path}/{filename}", f"{dest}/{filename}")
+
+    delta = {
+        "version": DELTA_VERSION,
+        "constants": {
+            "frame": constants_frame if constants_frame != old_constants_frame else None,
+            "tables": diff_tables(old_constants_tables, constants_tables),
+        },
+        "sheets": {
+            "frame": sheets_frame if sheets_frame != old_sheets_frame else None,
+            "tables": diff_tables(old_sheets_tables, sheets_tables),
+            "renders": renders if external else None,
+        },
+        "pages": [list(pixels.shape[:2]) for pixels in new.pages],
+        "cells": ops,
+        "png": {"compress_level": compress_level, "optimize": optimize},
+    }
+    with atomic_write(f"{dest}/delta.json") as fh:
+        json.dump(delta, fh)
+
+    # the constants.js part as statements a browser can run on top of the old tables
+    with atomic_write(f"{dest}/delta.js") as fh:
+        for line in constants_frame:
+            if isinstance(line, str) and line.startswith("rendersVersion = "):
+                fh.write(line)
+        for name, change in delta["constants"]["tables"].items():
+            for key in change["remove"]:
+                fh.write(f"delete {name}[{key}];\n")
+            for key, value in change["set"].items():
+                fh.write(f"{name}[{key}] = {value};\n")
+    return len(strip)
+
+
+def apply_delta(old, delta_path, dest):
+    """Rebuild the new outputs in dest from the old Outputs and the delta in delta_path.
+
+    constants.js comes out byte for byte and the atlas pixel for pixel; the pages are encoded again with
+    the PNG settings the delta was made with.
+    """
+    with open(f"{delta_path}/delta.json") as f:
+        delta = json.load(f)
+    if delta["version"] != DELTA_VERSION:
+        raise ValueError(f"unsupported delta version {delta['version']}")
+    os.makedirs(dest, exist_ok=True)
+
+    strip = np.asarray(Image.open(f"{delta_path}/delta.png").convert("RGBA"))
+    pages = []
+    for page, (height, width) in enumerate(delta["pages"]):
+        pixels = np.zeros((height, width, 4), np.uint8)
+        if page < len(old.pages):
+            h, w = min(height, old.pages[page].shape[0]), min(width, old.pages[page].shape[1])
+            pixels[:h, :w] = old.pages[page][:h, :w]
+        pages.append(pixels)
+    for page, x, y, kind, *src in delta["cells"]:
+        if kind == "old":
+            src_page, sx, sy = src
+            pages[page][y:y + CELL, x:x + CELL] = old.pages[src_page][sy:sy + CELL, sx:sx + CELL]
+        else:
+            n = src[0]
+            sx, sy = (n % STRIP_COLUMNS) * CELL, (n // STRIP_COLUMNS) * CELL
+            pages[page][y:y + CELL, x:x + CELL] = strip[sy:sy + CELL, sx:sx + CELL]
+    rendersdata = []
+    for pixels in pages:
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, "PNG", **delta["png"])
+        rendersdata.append(buf.getvalue())
+
+    frame, tables = split_tables(old.constants)
+    frame = delta["constants"]["frame"] or frame
+    for name, changes in delta["constants"]["tables"].items():
+        tables[name] = merge_table(tables.get(name, {}), changes)
+    constants = join_tables(frame, tables)
+
+    frame, tables = split_tables(split_sheets(old.sheets)[0])
+    frame = delta["sheets"]["frame"] or frame
+    for name, changes in delta["sheets"]["tables"].items():
+        tables[name] = merge_table(tables.get(name, {}), changes)
+    sheets = join_tables(frame, tables)
+
+    # sheet files for --sheets external: new ones from the delta, the rest from the old build
+    external = delta["sheets"]["renders"]
+    if external is not None:
+        for table in tables.values():
+            for value in table.values():
+                filename = value.strip("'")
+                for src in (f"{delta_path}/{filename}", f"{old.path}/{filename}"):
+                    if os.path.exists(src):
+                        if os.path.abspath(src) != os.path.abspath(f"{dest}/{filename}"):
+                            os.makedirs(os.path.dirname(f"{dest}/{filename}"), exist_ok=True)
+                            shutil.copyfile(src, f"{dest}/{filename}")
+                        break
+        for filename, data in zip(external, rendersdata):
+            os.makedirs(os.path.dirname(f"{dest}/{filename}"), exist_ok=True)
+            with atomic_write(f"{dest}/{filename}", "wb") as fh:
+                fh.write(data)
+
+    with atomic_write(f"{dest}/constants.js") as fh:
+        fh.write(constants)
+    write_renders(dest, rendersdata)
+    with atomic_write(f"{dest}/sheets.js") as fh:
+
+        def write_page(page):
+            if external is None:
+                write_data_uri(fh, rendersdata[page])
+            else:
+                fh.write(external[page])
+
+        fh.write(sheets)
+        write_renders_pages(fh, len(rendersdata), write_page)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Make or apply a delta between two Muledump Render builds')
+    commands = parser.add_subparsers(dest='command', required=True)
+    make = commands.add_parser('make', help='write the delta from an old to a new build')
+    make.add_argument('old', type=str, help='directory of the old build')
+    make.add_argument('new', type=str, help='directory of the new build')
+    make.add_argument('delta', type=str, help='directory to write the delta to')
+    make.add_argument('--png-compress-level', type=int, choices=range(10), metavar='0-9', help='zlib level the new build used', default=6)
+    make.add_argument('--png-optimize', action='store_true', help='the new build used --png-optimize')
+    apply = commands.add_parser('apply', help='rebuild the new build from the old one and a delta')
+    apply.add_argument('old', type=str, help='directory of the old build')
+    apply.add_argument('delta', type=str, help='directory of the delta')
+    apply.add_argument('dest', type=str, help='directory to write the new build to; may be the old one')
+    args = parser.parse_args(argv)
+
+    if args.command == "make":
+        cells = make_delta(Outputs(args.old), Outputs(args.new), args.delta, args.png_compress_level, args.png_optimize)
+        print(f"+ Wrote delta to {args.delta} ({cells} new cells)")
+    else:
+        apply_delta(Outputs(args.old), args.delta, args.dest)
+        print(f"+ Applied {args.delta} to {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
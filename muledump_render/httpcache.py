@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .cachedir import cache_dir
+from .output import atomic_write
+
+MAX_SIZE = 1024 * 1024 * 1024
+
+
+class HttpCache:
+    """Responses from the asset server kept between runs and revalidated with conditional GETs.
+
+    Bodies are stored once per sha256 under directory/bodies, and an sqlite index maps each url to its body,
+    ETag and Last-Modified. A cached url is requested again with If-None-Match / If-Modified-Since, so an
+    unchanged file costs a 304 instead of a download. Once the bodies take more than max_size bytes the least
+    recently used entries are evicted when the cache is closed. Several runs can share one directory at the same time.
+    """
+
+    def __init__(self, directory=None, max_size=MAX_SIZE):
+        self.directory = directory if directory is not None else cache_dir("http")
+        self.max_size = max_size
+        self.hits = self.misses = 0
+        self.bytes_downloaded = 0
+        os.makedirs(f"{self.directory}/bodies", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(f"{self.directory}/index.sqlite", timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, hash TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+
+    def body_path(self, hash):
+        return f"{self.directory}/bodies/{hash[:2]}/{hash}"
+
+    def read_body(self, hash):
+        try:
+            with open(self.body_path(hash), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # evicted by another run since the index was read
+            return None
+        return data if hashlib.sha256(data).hexdigest() == hash else None
+
+    def get(self, session, url):
+        """GET url through session, answering from the cache when the server says it has not changed."""
+        with self._lock:
+            entry = self._db.execute("SELECT etag, last_modified, hash FROM entries WHERE url = ?", (url,)).fetchone()
+        cached = None
+        headers = {}
+        if entry is not None:
+            etag, last_modified, hash = entry
+            cached = self.read_body(hash)
+            if cached is not None:
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+        response = session.get(url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.hits += 1
+                self._db.execute("UPDATE entries SET used = ? WHERE url = ?", (time.time(), url))
+            return cached
+
+        data = response.content
+        with self._lock:
+            self.misses += 1
+            self.bytes_downloaded += len(data)
+        if response.status_code == 200 and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            self.store(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), data)
+        return data
+
+    def store(self, url, etag, last_modified, data):
+        hash = hashlib.sha256(data).hexdigest()
+        path = self.body_path(hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_write(path, "wb") as fh:
+                fh.write(data)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", (url, etag, last_modified, hash, len(data), time.time()))
+
+    def evict(self):
+        # drop the least recently used urls until the distinct bodies fit in max_size, then delete bodies no url uses
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT hash, size FROM entries)").fetchone()[0]
+        if total <= self.max_size:
+            return
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            dropped = set()
+            for url, hash, size in self._db.execute("SELECT url, hash, size FROM entries ORDER BY used").fetchall():
+                if total <= self.max_size:
+                    break
+                self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                if self._db.execute("SELECT 1 FROM entries WHERE hash = ?", (hash,)).fetchone() is None:
+                    dropped.add(hash)
+                    total -= size
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        # a body removed here while another run still points at it is simply downloaded again by that run
+        for hash in dropped:
+            try:
+                os.remove(self.body_path(hash))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        # evict once at the end of a run rather than after every download
+        with self._lock:
+            self.evict()
+        self._db.close()
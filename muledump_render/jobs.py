@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .atlas import composite_tiles, tile_sheets
+from .sprites import SpriteIndex
+
+
+class SharedSheets:
+    # the part of a Source a SpriteIndex uses, in a worker: manifest.xml as the main process read it and
+    # sheets memory mapped from the .npy files it shared
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.paths = {}
+        self._maps = {}
+
+    def fetch(self, path):
+        if self.manifest is None:
+            raise FileNotFoundError(path)
+        return self.manifest
+
+    def load_image(self, imagename):
+        path = self.paths[imagename]
+        if path not in self._maps:
+            self._maps[path] = np.load(path, mmap_mode="r")
+        return self._maps[path]
+
+
+# the worker's SpriteIndex, kept between batches so each sheet is only cut into tiles once
+_index = None
+
+
+def composite_batch(manifest, paths, tiles):
+    # composite_tiles() on a worker process; paths maps the sheets the tiles use to their .npy files
+    global _index
+    if _index is None or _index.source.manifest != manifest:
+        _index = SpriteIndex(SharedSheets(manifest))
+    for imagename, path in paths.items():
+        if _index.source.paths.get(imagename) != path:
+            # a sheet that changed since the last batch, e.g. in --watch
+            _index.source.paths[imagename] = path
+            _index.forget(imagename)
+    return composite_tiles(_index, tiles)
+
+
+class JobPool:
+    """Worker processes that parse xml files and draw atlas tiles for --jobs.
+
+    Work is handed out in pieces and the results are merged back in the order they were asked for, so a
+    build comes out byte for byte the same as a serial one. Sheets are decoded once by the main process
+    and the workers memory map the .npy files of the source's sheet cache, or, without one, copies written
+    to a temporary directory, instead of reading and decoding the sheets again. Workers are started with spawn, so a pool is safe to create while the
+    fetch threads are running; close() stops them and removes the directory.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.executor = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn"))
+        self._dir = tempfile.TemporaryDirectory(prefix="muledump-render-")
+        self._shared = set()
+
+    def submit(self, fn, *args):
+        return self.executor.submit(fn, *args)
+
+    def share(self, source, imagename):
+        # the .npy file of a sheet's pixels, named by the hash of its PNG so a changed sheet gets a new file
+        key = source.sheet_hash(imagename)
+        if source.sheet_cache_dir is not None:
+            # load_image() leaves the decoded sheet in the cache directory
+            source.load_image(imagename)
+            return source.decoded.path(key)
+        path = os.path.join(self._dir.name, f"{key}.npy")
+        if key not in self._shared:
+            np.save(path, source.load_image(imagename))
+            self._shared.add(key)
+        return path
+
+    def composite(self, index, source, batches):
+        """composite_tiles() of every list of tiles in batches, drawn on the workers and yielded in order.
+
+        A few batches per worker are drawn ahead of the one being consumed, no more, so finished cells do
+        not pile up while the caller encodes them.
+        """
+        drawing = deque()
+        for tiles in batches:
+            paths = {sheet: self.share(source, sheet) for tile in tiles for sheet in tile_sheets(tile)}
+            drawing.append(self.executor.submit(composite_batch, index.manifest, paths, tiles))
+            if len(drawing) > 2 * self.jobs:
+                yield drawing.popleft().result()
+        while drawing:
+            yield drawing.popleft().result()
+
+    def close(self):
+        self.executor.shutdown()
+        self._dir.cleanup()
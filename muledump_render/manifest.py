@@ -0,0 +1,90 @@
+import hashlib
+import io
+import json
+import os
+
+from . import VERSION
+from .output import atomic_write, renders_filename
+
+MANIFEST_VERSION = 3
+
+
+def renderer():
+    # tiles copied between builds are only valid for the same renderer and Pillow (quantity text)
+    from PIL import __version__ as PILLOW_VERSION
+    return f"{VERSION}/Pillow {PILLOW_VERSION}"
+
+
+class PreviousBuild:
+    """The render-manifest.json and renders pages (PNG files) of the last build in a destination.
+
+    A page is only decoded once a cell is cut out of it.
+    """
+
+    def __init__(self, manifest, pages):
+        self.manifest = manifest
+        self.pages = pages
+        self.tiles = {tuple(tile): (page, x, y) for page, x, y, tile in manifest["tiles"]}
+        self._decoded = {}
+
+    @classmethod
+    def from_build(cls, source, assets, atlas):
+        """Keep a build that just finished in memory as the previous build for the next one."""
+        return cls(make_manifest(source, assets, atlas), atlas.pages)
+
+    def page(self, page):
+        """The RGBA pixels of a page."""
+        import numpy as np
+        from PIL import Image
+        if page not in self._decoded:
+            self._decoded[page] = np.asarray(Image.open(io.BytesIO(self.pages[page])).convert("RGBA"))
+        return self._decoded[page]
+
+    def cell(self, page, x, y):
+        """The 45x45 RGBA pixels of the cell at x, y on page."""
+        from .atlas import CELL
+        return self.page(page)[y:y + CELL, x:x + CELL]
+
+
+def load_previous(dest):
+    """Load the previous build in dest, or None when there is none or it does not match its manifest."""
+    manifest_path = f"{dest}/render-manifest.json"
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("renderer") != renderer():
+        print("+ Build manifest does not match the previous build, rebuilding everything")
+        return None
+    pages = []
+    for page, rendershash in enumerate(manifest["renders"]):
+        path = f"{dest}/{renders_filename(page)}"
+        rendersdata = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                rendersdata = f.read()
+        if rendersdata is None or hashlib.sha256(rendersdata).hexdigest() != rendershash:
+            print("+ Build manifest does not match the previous build, rebuilding everything")
+            return None
+        pages.append(rendersdata)
+    return PreviousBuild(manifest, pages)
+
+
+def make_manifest(source, assets, atlas):
+    return {
+        "version": MANIFEST_VERSION,
+        "renderer": renderer(),
+        "xml": assets.xml,
+        "sheets": source.sheet_hashes(),
+        "layouts": atlas.layouts,
+        "png": atlas.png,
+        "tiles": atlas.tiles,
+        "renders": [hashlib.sha256(data).hexdigest() for data in atlas.pages],
+    }
+
+
+def save_manifest(dest, source, assets, atlas):
+    """Record what went into the build in dest so the next --incremental run can reuse it."""
+    manifest = make_manifest(source, assets, atlas)
+    with atomic_write(f"{dest}/render-manifest.json") as fh:
+        json.dump(manifest, fh)
@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from . import VERSION
+from .output import atomic_write
+
+
+def peak_rss():
+    # bytes; None where the resource module is missing (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def timed(metrics, name):
+    # metrics.phase(name), or nothing when the build is not measured
+    return nullcontext() if metrics is None else metrics.phase(name)
+
+
+class Metrics:
+    """Timings and counters of one build, written out as a JSON report.
+
+    stages holds wall and CPU seconds of every build stage, xml the same per XML file, and phases the time
+    spent on each step of drawing tiles. collect() adds the cache, IO, memory and output figures the
+    source, atlas and destination hold at the end of the build.
+    """
+
+    def __init__(self):
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.stages = {}
+        self.xml = []
+        self.phases = {}
+        self.drawn = 0
+        self.report = {}
+
+    @contextmanager
+    def stage(self, name):
+        # process CPU time, so work done on the fetch pool counts towards the stage it happened in
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.stages[name] = {"wall": time.perf_counter() - wall, "cpu": time.process_time() - cpu}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    @contextmanager
+    def xml_file(self, href, size):
+        entry = {"href": href, "bytes": size, "reused": False}
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield entry
+        finally:
+            entry["wall"] = time.perf_counter() - wall
+            entry["cpu"] = time.thread_time() - cpu
+            self.xml.append(entry)
+
+    def collect(self, source, assets, atlas, dest):
+        from .output import SHEETS_DIR, renders_filename
+        cache = {
+            "tiles": {"cells": len(assets.cells), "hits": atlas.hits, "misses": atlas.misses, "reused": atlas.reused, "shared": atlas.shared},
+            "parse": {"hits": assets.cached, "misses": len(assets.xml) - assets.cached},
+            "http": None,
+        }
+        sheets = source.decoded
+        cache["sheets"] = {"memory_hits": sheets.memory_hits, "disk_hits": sheets.hits, "decoded": sheets.misses}
+        if source.http_cache is not None:
+            cache["http"] = {"unchanged": source.http_cache.hits, "downloaded": source.http_cache.misses, "bytes_downloaded": source.http_cache.bytes_downloaded}
+        outputs = ["constants.js", "sheets.js", "render-manifest.json"] + [renders_filename(page) for page in range(len(atlas.pages))]
+        if os.path.isdir(f"{dest}/{SHEETS_DIR}"):
+            outputs += [f"{SHEETS_DIR}/{name}" for name in sorted(os.listdir(f"{dest}/{SHEETS_DIR}"))]
+        self.drawn = atlas.misses - atlas.reused
+        self.report = {
+            "cache": cache,
+            "io": {"files_read": source.files_read, "bytes_read": source.bytes_read},
+            "peak_rss": peak_rss(),
+            "outputs": {name: os.path.getsize(f"{dest}/{name}") for name in outputs if os.path.exists(f"{dest}/{name}")},
+        }
+
+    def save(self, path):
+        data = {
+            "version": VERSION,
+            "started": self.started,
+            "stages": self.stages,
+            "xml": self.xml,
+            "tiles": {
+                "drawn": self.drawn,
+                "phases": self.phases,
+                "per_tile": {name: seconds / self.drawn for name, seconds in self.phases.items()} if self.drawn else {},
+            },
+            **self.report,
+        }
+        with atomic_write(path) as fh:
+            json.dump(data, fh, indent=2)
@@ -0,0 +1,205 @@
+import base64
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# a multiple of 3 so every chunk encodes to base64 without padding and the chunks can simply be concatenated
+BASE64_CHUNK = 3 * 64 * 1024
+# where external sheets are written, relative to dest and to the page that loads sheets.js
+SHEETS_DIR = "sheets"
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    # write next to path and move the file into place once it is complete, so readers never see half a file.
+    # The temporary name is unique, so several processes or threads can race to write the same path
+    tmp = f"{path}.{uuid.uuid4().hex[:12]}.tmp"
+    try:
+        with open(tmp, mode) as fh:
+            yield fh
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_constants(dest, assets, game_version="0.0.0.0.0", buildhash="", trim=None):
+    """Write constants.js from parse_assets() output; render_atlas() must have placed the items first.
+
+    With trim (a SheetTrim), skins and petSkins point into the trimmed sheets write_sheets() embeds.
+    """
+    now = datetime.now().strftime("%Y%m%d-%H%M%S")
+    with atomic_write(f"{dest}/constants.js") as fh:
+        fh.write("//  Generated with https://github.com/jakcodex/muledump-render\n")
+        fh.write(f"//  Realm of the Mad God v{game_version}")
+        if buildhash:
+            fh.write(f" (build: {buildhash})")
+        fh.write(f"\n\n")
+        fh.write(f'rendersVersion = "renders-{now}-{game_version}";\n\n')
+        fh.write('//   type: ["id", SlotType, Tier, x, y, FameBonus, feedPower, BagType, Soulbound, UT/ST, page],\n')
+        fh.write("items = {\n")
+        for itemid, itemdata in sorted(assets.items.items()):
+            if itemid == -1:
+                fh.write(f"  '{itemid}': {list(itemdata)},\n".replace("False,", "false,").replace("True,", "true,"))
+            else:
+                fh.write(f"  {itemid}: {list(itemdata)},\n".replace("False,", "false,").replace("True,", "true,"))
+        fh.write("};\n\n")
+        fh.write('//   type: ["id", base, averages, maxes, slots]\n')
+        fh.write("classes = {\n")
+        for classid, classdata in sorted(assets.classes.items()):
+            fh.write(f"  {classid}: {classdata.entry()},\n")
+        fh.write("};\n\n")
+        fh.write('//   type: ["id", index, 16x16, "sheet", class]\n')
+        fh.write("skins = {\n")
+        for skinid, skindata in sorted(assets.skins.items()):
+            if trim is not None:
+                skindata = trim.record(skindata)
+            fh.write(f"  {skinid}: {skindata.entry()},\n".replace("False,", "false,").replace("True,", "true,"))
+        fh.write("};\n\n")
+        fh.write('//   type: "id"\n')
+        fh.write("petAbilities = {\n")
+        for petAbilId, petAbilName in sorted(assets.petAbilities.items()):
+            fh.write(f'  {petAbilId}: "{petAbilName}",\n')
+        fh.write("};\n\n")
+        fh.write('//   texId: ["clothing id", clothing type, "accessory id", accessory type]\n')
+        fh.write("textures = {\n")
+        for textureId, textureData in sorted(assets.textures.items()):
+            fh.write(f"  {textureId}: {textureData},\n")
+        fh.write("}\n\n")
+        fh.write('//  type: ["id", "Family", "Rarity", "DefaultSkin", "Size"]\n')
+        fh.write("pets = {\n")
+        for petid, petdata in sorted(assets.pets.items()):
+            petdata = json.dumps(petdata.entry())
+            fh.write(f"  {petid}: {petdata},\n")
+        fh.write("};\n\n")
+        fh.write('//  type: ["id", "DisplayId", "ItemTier", "Family", "Rarity"]\n')
+        fh.write("petSkins = {\n")
+        for petskinid, petskindata in sorted(assets.petSkins.items()):
+            if trim is not None:
+                petskindata = trim.record(petskindata)
+            petskindata = json.dumps(petskindata.entry())
+            fh.write(f"  {petskinid}: {petskindata},\n")
+        fh.write("};\n")
+
+
+def renders_filename(page):
+    # the first page keeps the name older Muledump versions load
+    return "renders.png" if page == 0 else f"renders-{page}.png"
+
+
+def write_renders(dest, rendersdata):
+    """Write renders.png, renders-1.png, ... from atlas.pages and remove pages left by a bigger build."""
+    for page, data in enumerate(rendersdata):
+        with atomic_write(f"{dest}/{renders_filename(page)}", "wb") as fh:
+            fh.write(data)
+    page = len(rendersdata)
+    while os.path.exists(f"{dest}/{renders_filename(page)}"):
+        os.remove(f"{dest}/{renders_filename(page)}")
+        page += 1
+
+
+def write_data_uri(fh, data):
+    # stream the base64 in chunks instead of building the whole encoded string for large sheets
+    fh.write("data:image/png;base64,")
+    view = memoryview(data)
+    for offset in range(0, len(view), BASE64_CHUNK):
+        fh.write(base64.b64encode(view[offset:offset+BASE64_CHUNK]).decode("ascii"))
+
+
+def write_external(dest, name, data):
+    # save a sheet under a name that changes with its contents, so clients can cache it for good
+    filename = f"{SHEETS_DIR}/{name}.{hashlib.sha256(data).hexdigest()[:16]}.png"
+    if not os.path.exists(f"{dest}/{filename}"):
+        with atomic_write(f"{dest}/{filename}", "wb") as fh:
+            fh.write(data)
+    return filename
+
+
+def write_renders_pages(fh, count, write_page):
+    # the renders lines that end sheets.js; write_page(page) writes the data: URI or path of a page.
+    # The first page stays in renders for older Muledump versions
+    fh.write("renders = '")
+    write_page(0)
+    fh.write("';\n")
+    fh.write("rendersPages = [renders")
+    for page in range(1, count):
+        fh.write(", '")
+        write_page(page)
+        fh.write("'")
+    fh.write("];\n")
+
+
+def write_sheets(dest, source, assets, rendersdata, external=False, trim=None):
+    """Write sheets.js: the textiles, skin and pet skin sheets the assets use, and the renders pages.
+
+    By default every image is inlined as a data: URI. With external=True each one is written to
+    dest/sheets/<name>.<hash>.png instead and sheets.js only maps the names to those files; files no
+    longer referenced are removed. With trim (a SheetTrim), the textile, skin and pet skin sheets are
+    trimmed and recompressed by it; constants.js must be written with the same trim.
+    """
+    # queue every embedded sheet so they download in parallel while earlier ones are written
+    for textilefile in sorted(assets.textilefiles):
+        source.fetch_async(f"sheets/textile{textilefile}x{textilefile}.png")
+    for skinfile in sorted(assets.skinfiles):
+        source.fetch_async(f"sheets/{skinfile}.png")
+        source.fetch_async(f"sheets/{skinfile}_mask.png")
+    for petskinfile in sorted(assets.petskinfiles):
+        source.fetch_async(f"sheets/{petskinfile}.png")
+
+    written = set()
+    if external:
+        os.makedirs(f"{dest}/{SHEETS_DIR}", exist_ok=True)
+
+    def sheet_data(imagename, sheet=None):
+        if trim is not None:
+            return trim.pack(source, imagename, sheet)
+        return source.fetch_async(f"sheets/{imagename}.png").result()
+
+    with atomic_write(f"{dest}/sheets.js") as fh:
+
+        def write_sheet(name, data):
+            if external:
+                filename = write_external(dest, name, data)
+                written.add(filename)
+                fh.write(filename)
+            else:
+                write_data_uri(fh, data)
+
+        # textiles
+        fh.write("textiles = {\n")
+        for textilefile in sorted(assets.textilefiles):
+            fh.write(f"  {textilefile}: '")
+            write_sheet(f"textile{textilefile}x{textilefile}", sheet_data(f"textile{textilefile}x{textilefile}"))
+            fh.write("',\n")
+        fh.write("};\n\n")
+
+        # player skins
+        fh.write("skinsheets = {\n")
+        for skinfile in sorted(assets.skinfiles):
+            fh.write(f"  {skinfile}: '")
+            write_sheet(skinfile, sheet_data(skinfile))
+            fh.write("',\n")
+            fh.write(f"  {skinfile}Mask: '")
+            write_sheet(f"{skinfile}_mask", sheet_data(f"{skinfile}_mask", skinfile))
+            fh.write("',\n")
+        fh.write("};\n\n")
+
+        # pet skins
+        fh.write("petskinsheets = {\n")
+        for petskinfile in sorted(assets.petskinfiles):
+            fh.write(f"  {petskinfile}: '")
+            write_sheet(petskinfile, sheet_data(petskinfile))
+            fh.write("',\n")
+
+        fh.write("};\n\n")
+
+        write_renders_pages(fh, len(rendersdata), lambda page: write_sheet(renders_filename(page)[:-len(".png")], rendersdata[page]))
+
+    if external:
+        for filename in os.listdir(f"{dest}/{SHEETS_DIR}"):
+            if f"{SHEETS_DIR}/{filename}" not in written and filename.endswith(".png"):
+                os.remove(f"{dest}/{SHEETS_DIR}/{filename}")
@@ -0,0 +1,72 @@
+import os
+import pickle
+import threading
+
+from . import VERSION
+from .cachedir import evict_files, touch
+from .output import atomic_write
+
+# bump whenever read_objects() or the record classes change what they produce
+PARSE_VERSION = 1
+HEADER = f"muledump-render parse cache {PARSE_VERSION} {VERSION}\n".encode()
+MAX_SIZE = 256 * 1024 * 1024
+
+
+class ParseCache:
+    """read_objects() records of xml files, keyed by the sha256 of the file they were parsed from.
+
+    Records of the current run are held in memory. With a directory they are also stored there, one pickle
+    per file behind a header naming the cache format and renderer version, so a later run with different
+    atlas or output settings does not parse any xml it has seen. Files written by another version are
+    ignored and replaced. Every game patch adds files, so close() deletes the ones read or written longest
+    ago once they take more than max_size bytes.
+    """
+
+    def __init__(self, directory=None, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self._records = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, xmlhash):
+        return f"{self.directory}/{xmlhash}.records"
+
+    def get(self, xmlhash):
+        """The records of the xml file with this hash, or None if it has to be parsed."""
+        with self._lock:
+            records = self._records.get(xmlhash)
+        if records is None and self.directory is not None:
+            try:
+                with open(self.path(xmlhash), "rb") as f:
+                    data = f.read()
+                if data.startswith(HEADER):
+                    records = pickle.loads(memoryview(data)[len(HEADER):])
+                    touch(self.path(xmlhash))
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, TypeError):
+                # missing, from an older version or cut short by a run that died; parse the file again
+                records = None
+            if records is not None:
+                with self._lock:
+                    self._records[xmlhash] = records
+        with self._lock:
+            if records is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return records
+
+    def put(self, xmlhash, records):
+        with self._lock:
+            self._records[xmlhash] = records
+        if self.directory is not None:
+            with atomic_write(self.path(xmlhash), "wb") as fh:
+                fh.write(HEADER)
+                pickle.dump(records, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        # evict once at the end of a run, like HttpCache
+        if self.directory is not None:
+            evict_files(self.directory, ".records", self.max_size)
@@ -0,0 +1,79 @@
+from contextlib import nullcontext
+
+from .assets import parse_assets
+from .atlas import render_atlas
+from .manifest import save_manifest
+from .metrics import Metrics
+from .output import write_constants, write_renders, write_sheets
+from .source import gather_sources
+
+
+def build(source, dest, game_version="0.0.0.0.0", buildhash="", previous=None, compress_level=6, optimize=False, external_sheets=False, metrics=None, parse_cache=None, pool=None, trim_sheets=False, png_cache=None, stable_slots=False):
+    """Render source into dest, reusing previous (see load_previous) where nothing changed.
+
+    The outputs are the same as without previous, unless stable_slots keeps atlas cells where previous put
+    them (for --delta-from, see render_atlas).
+
+    XML files already in parse_cache (a ParseCache) are not parsed again. With a pool (a JobPool), XML is
+    parsed and tiles are drawn on its worker processes; the outputs are the same.
+
+    compress_level and optimize are the PNG settings of the atlas pages, as in Pillow. external_sheets writes
+    the images sheets.js uses as separate files instead of inlining them (see write_sheets). metrics is a
+    path to write a JSON report of stage timings, cache hit rates and output sizes to.
+
+    trim_sheets embeds only the skin and pet skin sprites the skins and petSkins tables use, and recompresses
+    the embedded sheets (see SheetTrim); png_cache (a PngCache) keeps the recompressed sheets between builds.
+    """
+    report = Metrics() if metrics is not None else None
+
+    def stage(name):
+        return nullcontext() if report is None else report.stage(name)
+
+    print("+ Gathering XML")
+    with stage("gather"):
+        xmlfiles = gather_sources(source, previous)
+
+    print("+ Processing XML")
+    with stage("parse"):
+        assets = parse_assets(xmlfiles, parse_cache, report, pool)
+    with stage("render"):
+        atlas = render_atlas(source, assets, previous, report, compress_level, optimize, pool, stable_slots)
+    if parse_cache is not None:
+        print(f"+ Parse cache: {assets.cached} of {len(assets.xml)} XML files were parsed before")
+    print(f"+ Tile cache: {atlas.hits} hits, {atlas.misses} misses")
+    print(f"+ Atlas: {atlas.misses - atlas.shared} cells on {len(atlas.pages)} page(s), {atlas.shared} tiles share a cell with identical pixels")
+    if previous is not None:
+        print(f"+ Reused {atlas.reused} of {atlas.misses} tiles and {atlas.copied} of {len(atlas.pages)} pages from the previous build")
+
+    trim = None
+    if trim_sheets:
+        from .sprites import load_manifest
+        from .trim import SheetTrim
+        trim = SheetTrim(assets, load_manifest(source)[1], png_cache)
+
+    print("+ Writing constants.js")
+    with stage("constants"):
+        write_constants(dest, assets, game_version, buildhash, trim)
+
+    print("+ Writing renders")
+    with stage("renders"):
+        write_renders(dest, atlas.pages)
+
+    print("+ Writing sheets.js")
+    with stage("sheets"):
+        write_sheets(dest, source, assets, atlas.pages, external_sheets, trim)
+    if trim is not None:
+        print(f"+ Trimmed sheets: {trim.original} bytes down to {trim.packed}, {trim.cache.hits} of {trim.cache.hits + trim.cache.misses} from the PNG cache")
+
+    print("+ Writing render-manifest.json")
+    with stage("manifest"):
+        save_manifest(dest, source, assets, atlas)
+
+    if source.http_cache is not None:
+        print(f"+ HTTP cache: {source.http_cache.hits} unchanged, {source.http_cache.misses} downloaded")
+
+    if report is not None:
+        print(f"+ Writing {metrics}")
+        report.collect(source, assets, atlas, dest)
+        report.save(metrics)
+    return assets, atlas
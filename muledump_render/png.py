@@ -0,0 +1,134 @@
+import io
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+MAXBLOCK = 65536
+
+
+def chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+# PNG filter types in the order Pillow tries them; a later filter is only taken when its sum is smaller.
+# Pillow only tries Average when optimizing
+FILTER_ORDER = [0, 2, 1, 4]
+OPTIMIZE_FILTER_ORDER = [0, 2, 1, 3, 4]
+
+
+def filter_rows(rows, prior, optimize=False):
+    """PNG-filter (n, width*4) RGBA rows whose row above the first is prior, picking for every row the
+    filter with the smallest sum of absolute differences the way Pillow does; returns (n, 1 + width*4)."""
+    x = rows
+    up = np.empty_like(x)
+    up[0] = prior
+    up[1:] = x[:-1]
+    left = np.zeros_like(x)
+    left[:, 4:] = x[:, :-4]
+    upleft = np.zeros_like(x)
+    upleft[:, 4:] = up[:, :-4]
+    average = (left >> 1) + (up >> 1) + (left & up & 1)
+    # paeth: whichever of left, up and up-left is closest to left + up - upleft, in that order on ties
+    a, b, c = left.astype(np.int16), up.astype(np.int16), upleft.astype(np.int16)
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upleft))
+    # uint8 arithmetic wraps, which is exactly the modulo 256 the filters are defined with
+    candidates = {0: x, 1: x - left, 2: x - up, 3: x - average, 4: x - paeth}
+    order = OPTIMIZE_FILTER_ORDER if optimize else FILTER_ORDER
+    filtered = np.stack([candidates[f] for f in order])
+    sums = np.minimum(filtered, 0 - filtered).sum(axis=-1, dtype=np.uint32)
+    # argmin takes the first of equal sums, as Pillow keeps the filter it tried first
+    best = sums.argmin(axis=0)
+    out = np.empty((len(x), x.shape[1] + 1), np.uint8)
+    out[:, 0] = np.array(order, np.uint8)[best]
+    out[:, 1:] = filtered[best, np.arange(len(x))]
+    return out
+
+
+class PngWriter:
+    """An RGBA PNG encoded a band of rows at a time, so the whole image never has to be in memory.
+
+    Rows are filtered and deflated with the same settings Pillow uses and the IDAT stream is split into
+    chunks of the same size, so finish() returns the bytes Image.save(..., "PNG") would have written for
+    compress levels 1 to 9 (level 0 only differs in how the stored blocks are cut), with or without optimize.
+
+    Deflating runs on a thread of its own (zlib releases the GIL), overlapping with whatever the caller
+    does until the next write; at most one band waits to be deflated.
+    """
+
+    def __init__(self, width, compress_level=6, optimize=False):
+        self.width = width
+        self.optimize = optimize
+        self.height = 0
+        self._prior = np.zeros(width * 4, np.uint8)
+        # optimize is Pillow's ZIP_OPTIMIZE: zlib's best compression and the Average filter as well
+        self._deflate = zlib.compressobj(9 if optimize else compress_level, zlib.DEFLATED, 15, 9, zlib.Z_FILTERED)
+        self._pool = ThreadPoolExecutor(1)
+        self._pending = None
+        self._data = []
+
+    def write(self, rows):
+        """Append (n, width, 4) uint8 rows."""
+        rows = rows.reshape(len(rows), self.width * 4)
+        filtered = filter_rows(rows, self._prior, self.optimize)
+        self._prior = rows[-1].copy()
+        self.height += len(rows)
+        if self._pending is not None:
+            self._data.append(self._pending.result())
+        self._pending = self._pool.submit(self._deflate.compress, filtered)
+
+    def finish(self):
+        if self._pending is not None:
+            self._data.append(self._pending.result())
+        self._pool.shutdown()
+        self._data.append(self._deflate.flush())
+        data = b"".join(self._data)
+        self._data = []
+        blocksize = max(MAXBLOCK, self.width * 4)
+        png = [SIGNATURE, chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0))]
+        for offset in range(0, len(data), blocksize):
+            png.append(chunk(b"IDAT", data[offset:offset + blocksize]))
+        png.append(chunk(b"IEND", b""))
+        return b"".join(png)
+
+
+def png_candidates(pixels):
+    # the lossless ways to store (h, w, 4) RGBA pixels as a PIL image and the save() arguments for each
+    from PIL import Image
+    yield Image.fromarray(np.ascontiguousarray(pixels), "RGBA"), {}
+    if (pixels[..., 3] == 255).all():
+        yield Image.fromarray(np.ascontiguousarray(pixels[..., :3]), "RGB"), {}
+    colors, indices = np.unique(np.ascontiguousarray(pixels).view(np.uint32).reshape(-1), return_inverse=True)
+    if len(colors) <= 256:
+        # exact RGBA palette entries, so fully transparent pixels keep their colour too
+        palette = colors.view(np.uint8).reshape(-1, 4)
+        image = Image.fromarray(indices.astype(np.uint8).reshape(pixels.shape[:2]), "P")
+        image.putpalette(palette[:, :3].tobytes())
+        # Pillow stores as many bits per pixel as the palette needs
+        args = {}
+        if (palette[:, 3] != 255).any():
+            args["transparency"] = palette[:, 3].tobytes()
+        yield image, args
+
+
+def smallest_png(pixels, original=None):
+    """The smallest PNG found for (h, w, 4) RGBA pixels: as RGBA, as RGB when every pixel is opaque and as
+    a palette image when there are at most 256 colours, each at zlib level 9 with every deflate strategy.
+    original, PNG bytes of the same pixels, is kept when nothing beats it. Every candidate is decoded
+    again before it is used, so the result always holds exactly the given pixels."""
+    from PIL import Image
+    best = original
+    for image, args in png_candidates(pixels):
+        for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE):
+            out = io.BytesIO()
+            image.save(out, "PNG", optimize=True, compress_type=strategy, **args)
+            data = out.getvalue()
+            if best is not None and len(data) >= len(best):
+                continue
+            if not np.array_equal(np.asarray(Image.open(io.BytesIO(data)).convert("RGBA")), pixels):
+                continue
+            best = data
+    return best
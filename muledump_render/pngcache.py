@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+
+from . import VERSION
+from .cachedir import evict_files, touch
+from .output import atomic_write
+
+# bump whenever smallest_png() or SheetTrim.pack() change what they produce
+PNG_VERSION = 1
+MAX_SIZE = 64 * 1024 * 1024
+
+
+class PngCache:
+    """Recompressed sheets from --trim-sheets, keyed by a hash of the sheet they came from and how it was packed.
+
+    Searching for the smallest PNG takes far longer than anything else done to a sheet, so each result is
+    kept in memory and, with a directory, stored there as a .png for later runs. Keys are made with key(),
+    which includes the cache format and renderer version, so a new version simply stops finding the old
+    files; close() deletes the ones used longest ago once they take more than max_size bytes.
+    """
+
+    def __init__(self, directory=None, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self._pngs = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(repr((PNG_VERSION, VERSION) + parts).encode()).hexdigest()
+
+    def path(self, key):
+        return f"{self.directory}/{key}.png"
+
+    def get(self, key, make):
+        """The PNG stored under key, or make() stored under it."""
+        with self._lock:
+            data = self._pngs.get(key)
+        if data is None and self.directory is not None:
+            try:
+                with open(self.path(key), "rb") as f:
+                    data = f.read()
+                touch(self.path(key))
+            except OSError:
+                data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if data is None:
+            data = make()
+            if self.directory is not None:
+                with atomic_write(self.path(key), "wb") as fh:
+                    fh.write(data)
+        with self._lock:
+            self._pngs[key] = data
+        return data
+
+    def close(self):
+        if self.directory is not None:
+            evict_files(self.directory, ".png", self.max_size)
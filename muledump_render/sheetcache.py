@@ -0,0 +1,99 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .cachedir import evict_files, touch
+from .output import atomic_write
+
+MEMORY_LIMIT = 256 * 1024 * 1024
+MAX_SIZE = 1024 * 1024 * 1024
+
+
+def decode_sheet(data):
+    # PNG bytes to an (h, w, 4) uint8 RGBA array
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    return np.asarray(img)
+
+
+class SheetCache:
+    """Decoded sprite sheets as RGBA arrays, keyed by the sha256 of the PNG they were decoded from.
+
+    With a directory the pixels are also stored there as .npy files and memory mapped, so later runs and
+    other processes sharing the directory skip inflating the PNG. At most memory_limit bytes of sheets are
+    held at once; the least recently used are dropped first. The directory is trimmed the same way: close()
+    deletes the files used longest ago once they take more than max_size bytes.
+    """
+
+    def __init__(self, directory=None, memory_limit=MEMORY_LIMIT, max_size=MAX_SIZE):
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self.max_size = max_size
+        self._arrays = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.memory_hits = self.hits = self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return f"{self.directory}/{key}.rgba.npy"
+
+    def get(self, key, load):
+        """Return the sheet for key, calling load() for its PNG bytes only if it has to be decoded."""
+        with self._lock:
+            if key in self._arrays:
+                self.memory_hits += 1
+                self._arrays.move_to_end(key)
+                return self._arrays[key]
+
+        sheet = None
+        if self.directory is not None:
+            path = self.path(key)
+            try:
+                sheet = np.load(path, mmap_mode="r")
+                touch(path)
+            except (OSError, ValueError):
+                # missing, or left unreadable by a run that died; decode it again and replace the file
+                pass
+        with self._lock:
+            if sheet is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if sheet is None:
+            sheet = decode_sheet(load())
+            if self.directory is not None:
+                with atomic_write(path, "wb") as fh:
+                    np.save(fh, sheet)
+                sheet = np.load(path, mmap_mode="r")
+
+        with self._lock:
+            if key not in self._arrays:
+                self._arrays[key] = sheet
+                self._size += sheet.nbytes
+            self._arrays.move_to_end(key)
+            # always keep the sheet just asked for, even when it is bigger than the whole limit
+            while self._size > self.memory_limit and len(self._arrays) > 1:
+                _, dropped = self._arrays.popitem(last=False)
+                self._size -= dropped.nbytes
+            return self._arrays[key]
+
+    def discard(self, key):
+        with self._lock:
+            sheet = self._arrays.pop(key, None)
+            if sheet is not None:
+                self._size -= sheet.nbytes
+
+    def close(self):
+        with self._lock:
+            # let go of the memory maps first; a mapped file cannot be deleted everywhere
+            self._arrays.clear()
+            self._size = 0
+        if self.directory is not None:
+            evict_files(self.directory, ".rgba.npy", self.max_size)
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from .assets import textile_size
+
+OBJECT = re.compile(rb"<Object\b.*?</Object>", re.S)
+CLASS = re.compile(rb"<Class>\s*(\w+)\s*</Class>")
+TEXTURE = re.compile(rb"<(Texture|AnimatedTexture|Mask)>(.*?)</\1>", re.S)
+FILE = re.compile(rb"<File>\s*([^<]+?)\s*</File>")
+TEX = re.compile(rb"<Tex[12]>\s*0x([0-9a-fA-F]+)\s*</Tex[12]>")
+SKIN = re.compile(rb"<Skin\s*/?>")
+
+
+def plan_sheets(xmldata):
+    """Pre-scan an xml file for the sheets a build will need from it, without parsing it.
+
+    Returns (drawn, embedded): the sheets atlas tiles are drawn from, textiles included, and the sheets
+    sheets.js embeds. This is only a hint for prefetching; anything it gets wrong is read when used.
+    """
+    drawn = set()
+    embedded = set()
+    for match in OBJECT.finditer(xmldata):
+        obj = match.group(0)
+        clazz = CLASS.search(obj)
+        clazz = clazz.group(1) if clazz is not None else None
+        files = [name.group(1).decode() for _, body in TEXTURE.findall(obj) for name in [FILE.search(body)] if name is not None]
+        if clazz in (b"Equipment", b"Dye"):
+            drawn.update(files)
+            for tex in TEX.findall(obj):
+                size = textile_size(int(tex, 16))
+                if size is not None:
+                    drawn.add(f"textile{size}x{size}")
+        elif clazz == b"PetSkin":
+            embedded.update(files)
+        elif clazz in (b"Player", b"Skin") or SKIN.search(obj):
+            embedded.update(files)
+            embedded.update(f"{name}_mask" for name in files)
+    return drawn, embedded
+
+
+class Source:
+    """A ROTMG asset tree: a local path, a .zip or .tar bundle of one (see Bundle), or a remote url such as
+    https://assets.muledump.com.
+
+    Files are fetched on a shared thread pool over one pooled keep-alive session. Decoded sheets are kept
+    by content hash in a SheetCache, so a long-running process can call clear() between builds and keep
+    them warm; sheet_cache_dir keeps them on disk between runs as well, up to sheet_cache_size bytes.
+    Remote files go through http_cache (an HttpCache) when one is given. The Source closes both caches.
+    """
+
+    def __init__(self, location, fetch_workers=16, sheet_cache_dir=None, sheet_memory_limit=None, sheet_cache_size=None, http_cache=None):
+        self.location = location[:-1] if location.endswith('/') else location
+        self.is_local = False if self.location.startswith("http") else True
+        self.bundle = None
+        if self.is_local and os.path.isfile(self.location):
+            from .bundle import Bundle
+            self.bundle = Bundle(self.location)
+        self.fetch_workers = fetch_workers
+        self.pool = ThreadPoolExecutor(max_workers=fetch_workers)
+        self._session = None
+        self.http_cache = http_cache
+        self._fetches = {}
+        self._xmls = {}
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._decoded = None
+        self._decodes = {}
+        # sheet name -> hash of sheets whose tiles a previous build can supply; see gather_sources
+        self.unchanged_sheets = {}
+        self.sheet_cache_dir = sheet_cache_dir
+        self.sheet_memory_limit = sheet_memory_limit
+        self.sheet_cache_size = sheet_cache_size
+        self.files_read = 0
+        self.bytes_read = 0
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.fetch_workers)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def fetch(self, path):
+        # read a file relative to the asset source
+        if self.bundle is not None:
+            data = self.bundle.read(path)
+        elif self.is_local:
+            with open(f"{self.location}/{path}", "rb") as f:
+                data = f.read()
+        elif self.http_cache is not None:
+            data = self.http_cache.get(self.session, f"{self.location}/{path}")
+        else:
+            data = self.session.get(f"{self.location}/{path}").content
+        with self._lock:
+            self.files_read += 1
+            self.bytes_read += len(data)
+        return data
+
+    def fetch_async(self, path):
+        # queue a download on the shared pool; repeated paths share one future
+        with self._lock:
+            if path not in self._fetches:
+                self._fetches[path] = self.pool.submit(self.fetch, path)
+            return self._fetches[path]
+
+    def fetch_xml_async(self, path):
+        # queue fetch_xml on the shared pool; like fetch_async, an xml file is only read again once forgotten
+        with self._lock:
+            if path not in self._xmls:
+                self._xmls[path] = self.pool.submit(self.fetch_xml, path)
+            return self._xmls[path]
+
+    def fetch_xml(self, path):
+        # read an xml file and pre-scan it on the same worker: the sheets the build will need from it are
+        # downloaded, and the ones tiles are drawn from decoded, while the main thread parses
+        data = self.fetch(path)
+        drawn, embedded = plan_sheets(data)
+        for imagename in embedded:
+            self.fetch_async(f"sheets/{imagename}.png")
+        for imagename in drawn:
+            self.decode_async(imagename)
+        return data
+
+    def decode_async(self, imagename):
+        # decode a sheet on the pool once it is downloaded; chained with a callback rather than waited on
+        # in a worker, so decodes can never hold every worker while their downloads sit in the queue
+        with self._lock:
+            if imagename in self._decodes:
+                return
+            self._decodes[imagename] = decoding = Future()
+
+        def decode(data):
+            try:
+                # hashed here rather than through sheet_hash, so a decode still running when its file is
+                # forgotten cannot leave the old hash behind; tiles from sheets the previous build already
+                # drew are copied, not drawn again
+                key = hashlib.sha256(data).hexdigest()
+                if self.unchanged_sheets.get(imagename) != key:
+                    self.decoded.get(key, lambda: data)
+                decoding.set_result(None)
+            except BaseException as e:
+                decoding.set_exception(e)
+
+        def downloaded(fetch):
+            if fetch.exception() is not None:
+                decoding.set_exception(fetch.exception())
+                return
+            try:
+                self.pool.submit(decode, fetch.result())
+            except RuntimeError as e:
+                # the pool was shut down
+                decoding.set_exception(e)
+
+        self.fetch_async(f"sheets/{imagename}.png").add_done_callback(downloaded)
+
+    def sheet(self, imagename):
+        return self.fetch_async(f"sheets/{imagename}.png").result()
+
+    def sheet_hash(self, imagename):
+        if imagename not in self._hashes:
+            self._hashes[imagename] = hashlib.sha256(self.sheet(imagename)).hexdigest()
+        return self._hashes[imagename]
+
+    def sheet_hashes(self):
+        return dict(self._hashes)
+
+    @property
+    def decoded(self):
+        if self._decoded is None:
+            from .sheetcache import MAX_SIZE, MEMORY_LIMIT, SheetCache
+            limit = MEMORY_LIMIT if self.sheet_memory_limit is None else self.sheet_memory_limit
+            max_size = MAX_SIZE if self.sheet_cache_size is None else self.sheet_cache_size
+            self._decoded = SheetCache(self.sheet_cache_dir, limit, max_size)
+        return self._decoded
+
+    def load_image(self, imagename):
+        # the sheet as an (h, w, 4) RGBA array; may be a read-only memory map
+        decoding = self._decodes.get(imagename)
+        if decoding is not None:
+            # let a prefetch that is still decoding finish; if it failed, the error is raised below
+            wait([decoding])
+        return self.decoded.get(self.sheet_hash(imagename), lambda: self.sheet(imagename))
+
+    def forget(self, paths):
+        """Drop the given files, e.g. sheets/foo.png, so they are read again on next use."""
+        with self._lock:
+            for path in paths:
+                self._fetches.pop(path, None)
+                self._xmls.pop(path, None)
+                if path.startswith("sheets/") and path.endswith(".png"):
+                    self._decodes.pop(path[len("sheets/"):-len(".png")], None)
+                    key = self._hashes.pop(path[len("sheets/"):-len(".png")], None)
+                    if key is not None and self._decoded is not None:
+                        self._decoded.discard(key)
+
+    def clear(self):
+        """Forget fetched files so the next build sees the current source; decoded sheets stay cached."""
+        with self._lock:
+            self._fetches = {}
+            self._xmls = {}
+            self._decodes = {}
+        self._hashes = {}
+
+    def close(self):
+        self.pool.shutdown()
+        if self.bundle is not None:
+            self.bundle.close()
+        if self._session is not None:
+            self._session.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
+        if self._decoded is not None:
+            self._decoded.close()
+
+
+def gather_sources(source, previous=None):
+    """List the xml files of a source and start fetching them; returns (href, future) pairs in order.
+
+    Each xml file is pre-scanned as it arrives (see plan_sheets) and the sheets it needs are fetched and
+    decoded in the background, skipping sheets unchanged since previous (see load_previous).
+    """
+    source.unchanged_sheets = previous.manifest["sheets"] if previous is not None else {}
+    hrefs = []
+    if not source.is_local:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(source.fetch("xml.html"), "html.parser")
+        for a in soup.find_all("a"):
+            hrefs.append(a.get("href").replace("\\", "/"))
+    elif source.bundle is not None:
+        hrefs = [f"xml/{f}" for f in source.bundle.listdir("xml")]
+    else:
+        dir_path = f"{source.location}/xml"
+        file_list = os.listdir(dir_path)
+        hrefs = [f"xml/{f}" for f in file_list if os.path.isfile(os.path.join(dir_path, f))]
+
+    # print("hrefs", hrefs)
+
+    # download everything up front; parse_assets consumes the results in href order
+    xmlfiles = []
+    for href in hrefs:
+        if href is not None:
+            xmlfetch = source.fetch_xml_async(href)
+            xmlfiles.append((href, xmlfetch))
+    return xmlfiles
@@ -0,0 +1,150 @@
+import hashlib
+from collections import namedtuple
+from xml.etree import ElementTree
+
+import numpy as np
+
+MANIFEST = "manifest.xml"
+
+# size: width and height of a tile in pixels
+# grid: True when index n is the nth tile reading the sheet left to right, top to bottom; False when it is
+#       the nth block of `step` tile rows down the left edge, as animated character sheets are laid out
+Layout = namedtuple("Layout", "size grid step")
+
+# sheets whose index counts down the left edge; only used when manifest.xml does not describe them
+ANIMATED_SHEETS = ["oryxSanctuaryChars32x32", "chars8x8dEncounters", "chars8x8rPets1", "chars16x16dEncounters2", "playerskins", "petsDivine", "epicHiveChars16x16", "playerskins16"]
+
+
+def guess_layout(imagename):
+    # the layout worked out from the sheet name, for sheets manifest.xml does not list
+    size = 8
+    if "16" in imagename or imagename == "petsDivine":
+        size = 16
+    elif "32" in imagename:
+        size = 32
+    # playerskins has right, down and up rows for every skin
+    return Layout(size, imagename not in ANIMATED_SHEETS, 3 if imagename == "playerskins" else 1)
+
+
+def parse_manifest(data):
+    """Sheet layouts from manifest.xml: {name: Layout}.
+
+    Every element with a name and a tile width describes one sheet, e.g.
+
+        <ImageSet name="lofiObj" w="8" h="8"/>
+        <AnimatedChars name="playerskins" w="8" h="8" sheetW="56" sheetH="24"/>
+
+    Elements whose tag starts with Animated are animated character sheets: index n is the block of sheetH
+    pixels (default: one tile) starting n blocks down the left edge.
+    """
+    layouts = {}
+    for elem in ElementTree.fromstring(data).iter():
+        name = elem.get("name") or elem.get("file")
+        size = elem.get("w") or elem.get("width")
+        if name is None or size is None:
+            continue
+        size = int(size)
+        if elem.tag.startswith("Animated"):
+            layouts[name] = Layout(size, False, int(elem.get("sheetH") or size) // size)
+        else:
+            layouts[name] = Layout(size, True, 1)
+    return layouts
+
+
+def load_manifest(source):
+    # manifest.xml from the asset root and its layouts, or None when the source has none. A server answers
+    # a missing file with an error page rather than an exception, so a manifest without layouts counts as none
+    try:
+        data = source.fetch(MANIFEST)
+        layouts = parse_manifest(data)
+    except (OSError, ElementTree.ParseError, ValueError):
+        return None, {}
+    if not layouts:
+        return None, {}
+    return data, layouts
+
+
+def slice_sheet(sheet, layout):
+    # every tile of a sheet as one contiguous (n, size, size, 4) array, or None where a tile would not line
+    # up with the sheet the way crop() cuts it
+    size, grid, step = layout
+    h, w = sheet.shape[:2]
+    if grid:
+        if w % size:
+            # tiles straddle rows; crop() rounds fractional offsets for these, keep doing that
+            return None
+        rows = -(-h // size)
+        padded = np.zeros((rows * size, w, 4), np.uint8)
+        padded[:h] = sheet
+        return np.ascontiguousarray(padded.reshape(rows, size, w // size, size, 4).swapaxes(1, 2).reshape(-1, size, size, 4))
+    block = size * step
+    rows = -(-h // block)
+    padded = np.zeros((rows * block, size, 4), np.uint8)
+    padded[:h, :min(w, size)] = sheet[:, :size]
+    return np.ascontiguousarray(padded.reshape(rows, block, size, 4)[:, :size])
+
+
+def crop(sheet, box):
+    # Image.crop on an array: coordinates are rounded and anything outside the sheet is transparent
+    x0, y0, x1, y1 = (int(round(v)) for v in box)
+    out = np.zeros((y1 - y0, x1 - x0, 4), np.uint8)
+    h, w = sheet.shape[:2]
+    cx0, cy0, cx1, cy1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+    if cx0 < cx1 and cy0 < cy1:
+        out[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = sheet[cy0:cy1, cx0:cx1]
+    return out
+
+
+class SpriteIndex:
+    """Where every sprite sits in its sheet, and the sheets cut into tiles once so a lookup is a slice.
+
+    Layouts come from manifest.xml in the source when it lists the sheet, otherwise from guess_layout().
+    manifest holds that file and digest its sha256, both None without one; tiles drawn under another
+    manifest are not reused.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.manifest, self.layouts = load_manifest(source)
+        self.digest = hashlib.sha256(self.manifest).hexdigest() if self.manifest is not None else None
+        self._tiles = {}
+
+    def layout(self, imagename):
+        return self.layouts.get(imagename) or guess_layout(imagename)
+
+    def mask_layout(self, maskname, imagename):
+        # masks are cut with the tile size of the sprite they cover unless the manifest says otherwise
+        if maskname in self.layouts:
+            return self.layouts[maskname]
+        return Layout(self.layout(imagename).size, True, 1)
+
+    def forget(self, imagename):
+        """Drop the tiles cut from a sheet, so they are cut again from its current pixels."""
+        for key in [key for key in self._tiles if key[0] == imagename]:
+            del self._tiles[key]
+
+    def tile(self, imagename, imageindex, layout=None):
+        """The (size, size, 4) sprite at imageindex; transparent where it falls outside the sheet."""
+        layout = layout or self.layout(imagename)
+        key = (imagename, layout)
+        if key not in self._tiles:
+            self._tiles[key] = slice_sheet(self.source.load_image(imagename), layout)
+        tiles = self._tiles[key]
+        if tiles is None:
+            return crop_tile(self.source.load_image(imagename), imageindex, layout)
+        if imageindex >= len(tiles):
+            return np.zeros((layout.size, layout.size, 4), np.uint8)
+        return tiles[imageindex]
+
+
+def crop_tile(sheet, imageindex, layout):
+    # the sprite cut from the sheet the way Image.crop does it, for sheets slice_sheet() cannot cut up
+    size, grid, step = layout
+    if grid:
+        srcw = sheet.shape[1] / size
+        srcx = size * (imageindex % srcw)
+        srcy = size * (imageindex // srcw)
+    else:
+        srcx = 0
+        srcy = step * size * imageindex
+    return crop(sheet, (srcx, srcy, srcx+size, srcy+size))
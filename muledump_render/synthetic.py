@@ -0,0 +1,167 @@
+"""Generate a fake ROTMG asset tree for benchmarks and offline runs.
+
+    python -m muledump_render.synthetic /tmp/assets --items 5000 --seed 1
+    python render.py --source /tmp/assets --dest /tmp/out
+
+The tree has xml/*.xml with Player, Equipment (masks, Tex1/Tex2 dyes, quantities, sets), Dye, Skin, Pet,
+PetSkin and PetAbility objects, the sheets they refer to with random pixels, textiles, and an xml.html
+index so it can also be served over HTTP. The same arguments always produce the same files.
+"""
+import argparse
+import os
+import random
+
+SPRITE_SHEETS = {
+    # name: tile size
+    "lofiObj": 8,
+    "lofiObj2": 8,
+    "lofiObj5": 8,
+    "lofiObj16": 16,
+    "lofiObj32": 32,
+    "petsDivine": 16,
+}
+MASK_SHEET = "lofiObjMask"
+SKIN_SHEETS = ["players", "playerskins", "playerskins16"]
+PET_SKIN_SHEETS = ["petSkins1", "petSkins16"]
+TEXTILES = [4, 5, 9, 10]
+SHEET_COLUMNS = 16
+OBJECTS_PER_FILE = 1000
+CLASS_STATS = ["MaxHitPoints", "MaxMagicPoints", "Attack", "Defense", "Speed", "Dexterity", "HpRegen", "MpRegen"]
+CLASSES = 16
+
+
+def write_sheet(path, width, height, rng):
+    # random pixels, about a third of them transparent so outlines and shadows have edges to work with
+    import numpy as np
+    from PIL import Image
+    pixels = np.random.default_rng(rng.randrange(1 << 32)).integers(0, 256, (height, width, 4), np.uint8)
+    pixels[..., 3] = np.where(pixels[..., 3] < 85, 0, 255)
+    Image.fromarray(pixels).save(path)
+
+
+def index(n, rng):
+    # sheet indexes are written both ways in the real files
+    return hex(n) if rng.random() < 0.7 else str(n)
+
+
+def dye(rng):
+    if rng.random() < 0.5:
+        return f"0x01{rng.randrange(1 << 24):06x}"
+    size = rng.choice(TEXTILES)
+    return f"0x{size:02x}0000{rng.randrange(size * size):02x}"
+
+
+def player(type):
+    stats = "".join(f'<{stat} max="{50 * (i + 1)}">{10 * (i + 1)}</{stat}>' for i, stat in enumerate(CLASS_STATS))
+    levels = "".join(f'<LevelIncrease min="1" max="{i + 2}">{stat}</LevelIncrease>' for i, stat in enumerate(CLASS_STATS))
+    return (f'<Object type="0x{type:04x}" id="Class {type}"><Class>Player</Class>'
+            f'<AnimatedTexture><File>players</File><Index>{type % 16}</Index></AnimatedTexture>'
+            f'<SlotTypes>1, 2, 6, 9, 0, 0, 0, 0</SlotTypes>{stats}{levels}</Object>')
+
+
+def equipment(type, n, rng, sprites):
+    sheet = rng.choice(list(SPRITE_SHEETS))
+    tag = "Texture" if rng.random() < 0.85 else "AnimatedTexture"
+    extra = ""
+    if rng.random() < 0.4:
+        extra += f"<Tier>{rng.randrange(15)}</Tier>"
+    if rng.random() < 0.2:
+        extra += "<Soulbound/>"
+    if rng.random() < 0.1:
+        extra += f"<Quantity>{rng.randrange(2, 10)}</Quantity>"
+    if rng.random() < 0.1:
+        extra += f"<XPBonus>{rng.randrange(10)}</XPBonus>"
+    if rng.random() < 0.1:
+        extra += f"<feedPower>{rng.randrange(500)}</feedPower>"
+    if rng.random() < 0.6:
+        extra += f"<BagType>{rng.randrange(9)}</BagType>"
+    if rng.random() < 0.2:
+        extra += f"<DisplayId>Display {n}</DisplayId>"
+    if sheet in ("lofiObj", "lofiObj2") and rng.random() < 0.2:
+        tex = rng.choice(["Tex1", "Tex2"])
+        extra += f"<Mask><File>{MASK_SHEET}</File><Index>0x{rng.randrange(sprites):x}</Index></Mask><{tex}>{dye(rng)}</{tex}>"
+    setname = ' setName="Set"' if rng.random() < 0.05 else ""
+    # reuse a few sprites so the atlas has tiles to share
+    sprite = rng.randrange(sprites // 4 if rng.random() < 0.2 else sprites)
+    return (f'<Object type="0x{type:04x}" id="Item {n}"{setname}><Class>Equipment</Class><SlotType>{rng.randrange(1, 27)}</SlotType>'
+            f'<{tag}><File>{sheet}</File><Index>{index(sprite, rng)}</Index></{tag}>{extra}</Object>')
+
+
+def generate_assets(root, items=1000, seed=0):
+    """Write a synthetic asset tree with about `items` atlas items to root."""
+    rng = random.Random(seed)
+    os.makedirs(f"{root}/xml", exist_ok=True)
+    os.makedirs(f"{root}/sheets", exist_ok=True)
+
+    # enough sprites that a bigger tree also draws more distinct tiles
+    sprites = max(64, min(items // 4, 4096))
+    rows = -(-sprites // SHEET_COLUMNS)
+    for name, size in SPRITE_SHEETS.items():
+        if name == "petsDivine":
+            write_sheet(f"{root}/sheets/{name}.png", size, size * sprites, rng)
+        else:
+            write_sheet(f"{root}/sheets/{name}.png", size * SHEET_COLUMNS, size * rows, rng)
+    write_sheet(f"{root}/sheets/{MASK_SHEET}.png", 8 * SHEET_COLUMNS, 8 * rows, rng)
+    for size in TEXTILES:
+        write_sheet(f"{root}/sheets/textile{size}x{size}.png", size * 16, size * 16, rng)
+    for name in SKIN_SHEETS + PET_SKIN_SHEETS:
+        size = 16 if "16" in name else 8
+        write_sheet(f"{root}/sheets/{name}.png", size * 7, size * 3 * 64, rng)
+        write_sheet(f"{root}/sheets/{name}_mask.png", size * 7, size * 3 * 64, rng)
+
+    objects = [player(0x0300 + i) for i in range(CLASSES)]
+    type = 0x1000
+    for n in range(items):
+        type += 1
+        kind = rng.random()
+        if kind < 0.85:
+            objects.append(equipment(type, n, rng, sprites))
+        else:
+            tex = rng.choice(["Tex1", "Tex2"])
+            objects.append(f'<Object type="0x{type:04x}" id="Dye {n}"><Class>Dye</Class><SlotType>10</SlotType>'
+                           f'<Texture><File>lofiObj</File><Index>0x{rng.randrange(sprites):x}</Index></Texture>'
+                           f'<Mask><File>{MASK_SHEET}</File><Index>0x{rng.randrange(sprites):x}</Index></Mask>'
+                           f'<{tex}>{dye(rng)}</{tex}><BagType>1</BagType></Object>')
+        # the tables that do not go into the atlas grow with it
+        if kind < 0.05:
+            type += 1
+            objects.append(f'<Object type="0x{type:04x}" id="Skin {n}"><Class>Skin</Class><Skin/>'
+                           f'<PlayerClassType>0x{0x0300 + rng.randrange(CLASSES):04x}</PlayerClassType>'
+                           f'<AnimatedTexture><File>{rng.choice(SKIN_SHEETS[1:])}</File><Index>{rng.randrange(64)}</Index></AnimatedTexture></Object>')
+        elif kind < 0.08:
+            type += 1
+            objects.append(f'<Object type="0x{type:04x}" id="Pet {n}"><Class>Pet</Class><Family>\n  Canine\n</Family>'
+                           f'<Rarity>Common</Rarity><DefaultSkin>Pet Skin {n}</DefaultSkin><Size>{rng.randrange(50, 150)}</Size></Object>')
+        elif kind < 0.11:
+            type += 1
+            objects.append(f'<Object type="0x{type:04x}" id="Pet Skin {n}"><Class>PetSkin</Class><DisplayId>Pet Skin {n}</DisplayId>'
+                           f'<ItemTier>{rng.randrange(3)}</ItemTier><Family>Canine</Family><Rarity>Rare</Rarity>'
+                           f'<AnimatedTexture><File>{rng.choice(PET_SKIN_SHEETS)}</File><Index>0x{rng.randrange(64):x}</Index></AnimatedTexture></Object>')
+        elif kind < 0.12:
+            type += 1
+            objects.append(f'<Object type="0x{type:04x}" id="Ability {n}"><Class>PetAbility</Class><PetAbility/></Object>')
+
+    hrefs = []
+    for start in range(0, len(objects), OBJECTS_PER_FILE):
+        href = f"xml/objects{start // OBJECTS_PER_FILE}.xml"
+        with open(f"{root}/{href}", "w") as fh:
+            fh.write("<Objects>\n" + "\n".join(objects[start:start + OBJECTS_PER_FILE]) + "\n</Objects>\n")
+        hrefs.append(href)
+    with open(f"{root}/xml/ground.xml", "w") as fh:
+        fh.write('<GroundTypes>\n<Ground type="0x0001" id="Grass"/>\n</GroundTypes>\n')
+    hrefs.append("xml/ground.xml")
+    with open(f"{root}/xml.html", "w") as fh:
+        fh.write("<html><body>\n" + "\n".join(f'<a href="{href}">{href}</a>' for href in hrefs) + "\n</body></html>\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic ROTMG asset tree')
+    parser.add_argument('dest', type=str, help='directory to write the asset tree to')
+    parser.add_argument('--items', type=int, help='number of atlas items', default=1000)
+    parser.add_argument('--seed', type=int, help='random seed', default=0)
+    args = parser.parse_args(argv)
+    generate_assets(args.dest, args.items, args.seed)
+
+
+if __name__ == "__main__":
+    main()
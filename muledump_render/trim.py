@@ -0,0 +1,70 @@
+import numpy as np
+
+from .png import smallest_png
+from .pngcache import PngCache
+from .sprites import crop
+
+# rows of sprites one index covers on a sheet manifest.xml does not list: right, down and up for a player
+# skin, one row for a pet skin
+SKIN_ROWS = 3
+PETSKIN_ROWS = 1
+
+
+class SheetTrim:
+    """The skin and pet skin sheets sheets.js embeds, cut down to the sprites the skins and petSkins tables use.
+
+    On those sheets an index is a block of rows down the sheet, as tall as the layout in manifest.xml says or
+    else SKIN_ROWS or PETSKIN_ROWS rows of 8 (16 for 16x16 skins) pixels. pack() keeps only the referenced
+    blocks, stacked in the order of their indices at the full width of the sheet, and record() gives a record
+    the index of its block in the packed sheet. Masks are packed like the sheet they belong to. Sheets
+    manifest.xml cuts into a grid of tiles and sheets nothing references are kept whole.
+
+    Every sheet, textiles included, is recompressed with smallest_png(). The results are kept in cache (a
+    PngCache), keyed by the hash of the original PNG and the blocks taken from it.
+    """
+
+    def __init__(self, assets, layouts, cache=None):
+        self.cache = cache if cache is not None else PngCache()
+        self.original = self.packed = 0
+        blocks = {}
+        used = {}
+        for records, rows in ((assets.skins.values(), SKIN_ROWS), (assets.petSkins.values(), PETSKIN_ROWS)):
+            for record in records:
+                layout = layouts.get(record.sheet)
+                if layout is None:
+                    block = (16 if record.size16 else 8) * rows
+                elif not layout.grid:
+                    block = layout.size * layout.step
+                else:
+                    # the index counts tiles across the sheet, so there are no rows to drop
+                    block = None
+                blocks.setdefault(record.sheet, block)
+                used.setdefault(record.sheet, set()).add(record.index)
+        # sheet -> (block height, referenced indices in order)
+        self.plans = {sheet: (block, sorted(used[sheet])) for sheet, block in blocks.items() if block is not None}
+        self._indices = {sheet: {index: new for new, index in enumerate(plan[1])} for sheet, plan in self.plans.items()}
+
+    def record(self, record):
+        # a SkinRecord or PetSkinRecord pointing into the packed sheet
+        if record.sheet not in self._indices:
+            return record
+        return record._replace(index=self._indices[record.sheet][record.index])
+
+    def pack(self, source, imagename, sheet=None):
+        """The PNG sheets.js embeds for sheets/{imagename}.png, packed with the plan of sheet (default: imagename)."""
+        plan = self.plans.get(imagename if sheet is None else sheet)
+        data = self.cache.get(PngCache.key(source.sheet_hash(imagename), plan), lambda: self._pack(source, imagename, plan))
+        self.original += len(source.sheet(imagename))
+        self.packed += len(data)
+        return data
+
+    def _pack(self, source, imagename, plan):
+        pixels = source.load_image(imagename)
+        original = source.sheet(imagename)
+        if plan is not None:
+            block, used = plan
+            width = pixels.shape[1]
+            packed = np.concatenate([crop(pixels, (0, index * block, width, (index + 1) * block)) for index in used])
+            if not np.array_equal(packed, pixels):
+                pixels, original = packed, None
+        return smallest_png(pixels, original)
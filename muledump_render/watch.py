@@ -0,0 +1,160 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from .manifest import PreviousBuild
+from .pipeline import build
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT = struct.Struct("iIII")
+
+# "." is the asset root itself, for manifest.xml
+WATCH_DIRS = (".", "xml", "sheets")
+WATCH_SUFFIXES = (".xml", ".png")
+DEBOUNCE = 0.1
+POLL_INTERVAL = 0.5
+
+
+def relevant(name):
+    return name.endswith(WATCH_SUFFIXES) and not name.startswith(".")
+
+
+def watched_path(directory, name):
+    # path relative to the asset root, as Source.forget() expects it
+    return name if directory == "." else f"{directory}/{name}"
+
+
+class InotifyWatcher:
+    # linux only; waits on the kernel instead of rescanning the tree
+
+    def __init__(self, root):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        for d in WATCH_DIRS:
+            path = f"{root}/{d}"
+            if os.path.isdir(path):
+                wd = libc.inotify_add_watch(self.fd, path.encode(), WATCH_MASK)
+                if wd < 0:
+                    os.close(self.fd)
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+                self.dirs[wd] = d
+
+    def read(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset+length].rstrip(b"\0").decode()
+            offset += length
+            if wd in self.dirs and relevant(name):
+                changed.add(watched_path(self.dirs[wd], name))
+        return changed
+
+    def wait(self):
+        changed = set()
+        while not changed:
+            select.select([self.fd], [], [])
+            changed |= self.read()
+        # editors and asset exports write several files at once; collect them into one rebuild
+        while select.select([self.fd], [], [], DEBOUNCE)[0]:
+            changed |= self.read()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    # fallback for platforms without inotify
+
+    def __init__(self, root):
+        self.root = root
+        self.files = self.snapshot()
+
+    def snapshot(self):
+        files = {}
+        for d in WATCH_DIRS:
+            path = f"{self.root}/{d}"
+            if not os.path.isdir(path):
+                continue
+            for entry in os.scandir(path):
+                if entry.is_file() and relevant(entry.name):
+                    st = entry.stat()
+                    files[watched_path(d, entry.name)] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def wait(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            files = self.snapshot()
+            changed = {path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path)}
+            self.files = files
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(root):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError, TypeError):
+            # no libc to load, or one without inotify
+            pass
+    return PollingWatcher(root)
+
+
+def watch(source, dest, game_version="0.0.0.0.0", buildhash="", previous=None, **options):
+    """Build source into dest, then rebuild whenever its xml or sheets change until interrupted.
+
+    Between rebuilds the parsed xml, tile layout and atlas of the last build are kept in memory, so only
+    files that changed are read again and only tiles that depend on them are redrawn. options are passed
+    on to build().
+    """
+    if not source.is_local or source.bundle is not None:
+        raise ValueError("--watch needs a local --source")
+
+    watcher = make_watcher(source.location)
+    try:
+        assets, atlas = build(source, dest, game_version, buildhash, previous, **options)
+        previous = PreviousBuild.from_build(source, assets, atlas)
+        while True:
+            print(f"+ Watching {source.location} for changes (Ctrl+C to stop)")
+            changed = watcher.wait()
+            print("")
+            print(f"+ Changed: {', '.join(sorted(changed))}")
+            source.forget(changed)
+            start = time.perf_counter()
+            try:
+                assets, atlas = build(source, dest, game_version, buildhash, previous, **options)
+            except Exception as e:
+                # keep watching; outputs are written atomically, so a failed rebuild never leaves a truncated file behind
+                print(f"+ Rebuild failed: {e!r}")
+                continue
+            previous = PreviousBuild.from_build(source, assets, atlas)
+            print(f"+ Rebuilt in {time.perf_counter()-start:.2f}s")
+    except KeyboardInterrupt:
+        print("")
+        print("+ Stopped watching")
+    finally:
+        watcher.close()
@@ -0,0 +1,30 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from muledump_render import watch
+
+
+class MakeWatcherTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def test_polls_off_linux(self):
+        with mock.patch.object(watch.sys, "platform", "win32"), \
+                mock.patch.object(watch, "InotifyWatcher", side_effect=AssertionError("inotify tried")):
+            watcher = watch.make_watcher(self.root)
+        self.assertIsInstance(watcher, watch.PollingWatcher)
+
+    def test_polls_without_libc(self):
+        # what Windows does: find_library("c") finds nothing and CDLL(None) raises TypeError
+        with mock.patch.object(watch.sys, "platform", "linux"), \
+                mock.patch.object(watch.ctypes.util, "find_library", return_value=None), \
+                mock.patch.object(watch.ctypes, "CDLL", side_effect=TypeError("argument of type 'NoneType' is not iterable")):
+            watcher = watch.make_watcher(self.root)
+        self.assertIsInstance(watcher, watch.PollingWatcher)
+
+
+if __name__ == "__main__":
+    unittest.main()